@@ -0,0 +1,471 @@
+import argparse
+import fnmatch
+import gzip
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import numpy as np
+import pandas as pd
+from pi_modules.decode import loads
+from pi_modules.times import to_timestamp, to_timedelta
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(document) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(document)
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def _select(document, fields: list):
+    """
+    Apply a selectedFields projection (e.g. ["Items.Timestamp", "Items.Value"]) to a response document.
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split("."):
+            node = node.setdefault(part, {})
+
+    def project(value, node):
+        if not node:
+            return value
+        if isinstance(value, list):
+            return [project(item, node) for item in value]
+        if isinstance(value, dict):
+            return {key: project(value[key], child) for key, child in node.items() if key in value}
+        return value
+
+    return project(document, tree)
+
+
+def _json_path(document, path: str) -> list:
+    """
+    Evaluate the subset of JSONPath used by batch Parameters, e.g. "$.lookup0.Content.Items[*].Object.WebId".
+    """
+    values = [document]
+    for part in re.findall(r"[^.\[\]]+|\[[^\]]*\]", path.lstrip("$")):
+        selected = []
+        for value in values:
+            if part == "[*]":
+                selected.extend(value if isinstance(value, list) else [])
+            elif part.startswith("["):
+                index = int(part[1:-1])
+                if isinstance(value, list) and -len(value) <= index < len(value):
+                    selected.append(value[index])
+            elif isinstance(value, dict) and part in value:
+                selected.append(value[part])
+        values = selected
+    return values
+
+
+class MockPIWebAPI:
+    def __init__(self, points: int = 1000, event_interval: float = 60.0, latency: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, extra_fields: bool = True, compress: bool = False, attributes_per_element: int = 10,
+                 data_server: str = "PIMOCK", asset_server: str = "PIMOCKAF", asset_database: str = "Bench", seed: int = 0,
+                 host: str = "127.0.0.1", port: int = 0):
+        """ Initialize an offline stand-in for the PI Web API serving synthetic data.
+        Points are named BENCH000000, BENCH000001, ... and record a sine wave every event_interval seconds.
+        The asset database holds elements Unit0000, Unit0001, ... with attributes Attr0, Attr1, ... referencing the points.
+        :param points: The number of points on the data server.
+        :param event_interval: The number of seconds between two recorded values of a point.
+        :param latency: The number of seconds every request is delayed before it is answered.
+        :param error_rate: The fraction of requests answered with error_status instead.
+        :param error_status: The status code of injected errors.
+        :param extra_fields: Whether values carry the Good, Questionable, Substituted, Annotated and UnitsAbbreviation fields.
+        :param compress: Whether responses are gzip-compressed for clients that accept it.
+        :param attributes_per_element: The number of attributes per element of the asset database.
+        :param data_server: The name of the data server.
+        :param asset_server: The name of the asset server.
+        :param asset_database: The name of the asset database.
+        :param seed: The seed of the error injection.
+        :param host: The address to listen on.
+        :param port: The port to listen on (a free port if 0).
+        """
+        self.points = points
+        self.event_interval = pd.Timedelta(seconds=event_interval)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.extra_fields = extra_fields
+        self.compress = compress
+        self.attributes_per_element = attributes_per_element
+        self.data_server = data_server
+        self.asset_server = asset_server
+        self.asset_database = asset_database
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        self.point_paths = {f"\\\\{data_server}\\{self.tag(i)}".lower(): i for i in range(points)}
+        self.element_names = [f"Unit{j:04d}" for j in range(math.ceil(points / attributes_per_element))]
+        self.element_paths = {}
+        self.attribute_paths = {}
+        for j, name in enumerate(self.element_names):
+            element = f"\\\\{asset_server}\\{asset_database}\\{name}"
+            self.element_paths[element.lower()] = j
+            for k in range(min(attributes_per_element, points - j * attributes_per_element)):
+                self.attribute_paths[f"{element}|Attr{k}".lower()] = j * attributes_per_element + k
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, which Nagle's algorithm would delay on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, document, headers = mock.handle(method, self.path, body)
+                payload = _dumps(document) if document is not None else b""
+                if mock.compress and payload and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    payload = gzip.compress(payload, compresslevel=1)
+                    headers = {**headers, "Content-Encoding": "gzip"}
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with mock._lock:
+                    mock.stats["requests"] += 1
+                    mock.stats["bytes_received"] += len(body) + len(self.requestline)
+                    mock.stats["bytes_sent"] += len(payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/piwebapi"
+
+    @staticmethod
+    def tag(index: int) -> str:
+        return f"BENCH{index:06d}"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {"requests": 0, "bytes_received": 0, "bytes_sent": 0}
+
+    def start(self) -> "MockPIWebAPI":
+        """
+        Serve requests on a background thread.
+        :return: The server, so it can be used as mock = MockPIWebAPI().start().
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Synthetic data
+
+    def _index(self, webid: str):
+        # Points and the attributes referencing them share the same stream
+        if len(webid) == 7 and webid[0] in "PA" and webid[1:].isdigit() and int(webid[1:]) < self.points:
+            return int(webid[1:])
+        return None
+
+    def _signal(self, index: int, ns: np.ndarray) -> np.ndarray:
+        return 50.0 + 40.0 * np.sin(ns / 1e9 * 2 * np.pi / 86400 + index * 0.1)
+
+    def _items(self, index: int, ns: np.ndarray, values: np.ndarray = None) -> list:
+        if values is None:
+            values = self._signal(index, ns)
+        stamps = np.datetime_as_string(ns.astype("datetime64[ns]"), unit="s")
+        if not self.extra_fields:
+            return [{"Timestamp": f"{stamp}Z", "Value": value} for stamp, value in zip(stamps.tolist(), values.tolist())]
+        return [
+            {"Timestamp": f"{stamp}Z", "Value": value, "UnitsAbbreviation": "", "Good": True,
+             "Questionable": False, "Substituted": False, "Annotated": False}
+            for stamp, value in zip(stamps.tolist(), values.tolist())
+        ]
+
+    def _grid(self, start: pd.Timestamp, end: pd.Timestamp, step: pd.Timedelta, limit: int = None, aligned: bool = True) -> np.ndarray:
+        first = -(-start.value // step.value) * step.value if aligned else start.value
+        count = max(0, (end.value - first) // step.value + 1)
+        if limit is not None:
+            count = min(count, limit)
+        return first + np.arange(count, dtype=np.int64) * step.value
+
+    def _stream(self, index: int, endpoint: str, params: dict):
+        """
+        Build the items of one stream endpoint, or raise ValueError for invalid parameters.
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        if endpoint == "value":
+            ns = self._grid(now - self.event_interval, now, self.event_interval)[-1:]
+            return self._items(index, ns)[0]
+        start = to_timestamp(params.get("starttime", ["*-1d"])[0], now)
+        end = to_timestamp(params.get("endtime", ["*"])[0], now)
+        if endpoint == "recorded":
+            return self._items(index, self._grid(start, end, self.event_interval, int(params.get("maxcount", ["1000"])[0])))
+        if endpoint == "interpolated":
+            return self._items(index, self._grid(start, end, to_timedelta(params.get("interval", ["1h"])[0]), aligned=False))
+        if endpoint == "plot":
+            intervals = int(params.get("intervals", ["24"])[0])
+            ns = self._grid(start, end, self.event_interval)
+            if len(ns) > intervals * 4:
+                # Keep the first, last, minimum and maximum value of every interval
+                values = self._signal(index, ns)
+                keep = set()
+                for part in np.array_split(np.arange(len(ns)), intervals):
+                    if len(part):
+                        keep.update((part[0], part[-1], part[np.argmin(values[part])], part[np.argmax(values[part])]))
+                ns = ns[sorted(keep)]
+            return self._items(index, ns)
+        if endpoint == "summary":
+            duration = to_timedelta(params.get("summaryduration", [str(end - start)])[0]) if "summaryduration" in params else end - start
+            items = []
+            window_start = start
+            while window_start < end:
+                window_end = min(window_start + duration, end)
+                ns = self._grid(window_start, window_end, self.event_interval)
+                values = self._signal(index, ns)
+                for summary_type in params.get("summarytype", ["Total"]):
+                    for kind in summary_type.split(","):
+                        items.append({"Type": kind.strip(), "Value": self._summary(kind.strip(), values, window_start, window_end)})
+                window_start = window_end
+            return items
+        raise ValueError(f"Unsupported stream endpoint '{endpoint}'.")
+
+    def _summary(self, kind: str, values: np.ndarray, start: pd.Timestamp, end: pd.Timestamp) -> dict:
+        functions = {
+            "Average": np.mean, "Minimum": np.min, "Maximum": np.max, "Range": np.ptp, "StdDev": np.std,
+            "Count": len, "PopulationStdDev": np.std,
+            "Total": lambda v: float(np.mean(v)) * (end - start).total_seconds() / 86400,
+        }
+        if kind not in functions:
+            raise ValueError(f"Unsupported summary type '{kind}'.")
+        value = float(functions[kind](values)) if len(values) else None
+        item = {"Timestamp": start.strftime("%Y-%m-%dT%H:%M:%SZ"), "Value": value}
+        if self.extra_fields:
+            item.update({"UnitsAbbreviation": "", "Good": value is not None, "Questionable": False,
+                         "Substituted": False, "Annotated": False})
+        return item
+
+    # Request routing
+
+    def handle(self, method: str, url: str, body: bytes = b""):
+        """
+        Answer one request.
+        :param method: The HTTP method.
+        :param url: The request path and query string.
+        :param body: The request body.
+        :return: A (status, document, headers) tuple.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            return self.error_status, {"Errors": ["Injected error."]}, {"Retry-After": "0"}
+        split = urlsplit(url)
+        query = {}
+        for key, value in parse_qsl(split.query, keep_blank_values=True):
+            # PI Web API query parameter names are case-insensitive
+            query.setdefault(key.lower(), []).append(value)
+        path = re.sub(r"^/piwebapi", "", split.path)
+        try:
+            status, document = self._route(method, path, query, body)
+        except ValueError as e:
+            return 400, {"Errors": [str(e)]}, {}
+        if document is not None and "selectedfields" in query:
+            document = _select(document, query["selectedfields"][0].split(";"))
+        return status, document, {}
+
+    def _multiple(self, paths: list, index: dict, prefix: str, name):
+        items = []
+        for path in paths:
+            position = index.get(path.lower())
+            if position is None:
+                items.append({"Identifier": path, "Exception": {"Errors": [f"'{path}' was not found."]}})
+            else:
+                items.append({"Identifier": path, "Object": {"WebId": f"{prefix}{position:06d}", "Name": name(path), "Path": path}})
+        return (207 if any("Exception" in item for item in items) else 200), {"Items": items}
+
+    def _elements(self, query: dict) -> list:
+        elements = [
+            {"WebId": f"E{j:06d}", "Name": name, "Path": f"\\\\{self.asset_server}\\{self.asset_database}\\{name}",
+             "TemplateName": "BenchUnit", "HasChildren": False}
+            for j, name in enumerate(self.element_names)
+        ]
+        if "namefilter" in query:
+            elements = [e for e in elements if fnmatch.fnmatch(e["Name"].lower(), query["namefilter"][0].lower())]
+        if "templatename" in query:
+            elements = [e for e in elements if e["TemplateName"].lower() == query["templatename"][0].lower()]
+        start = int(query.get("startindex", ["0"])[0])
+        return elements[start:start + int(query.get("maxcount", ["1000"])[0])]
+
+    def _route(self, method: str, path: str, query: dict, body: bytes):
+        if method == "GET" and path == "/dataservers":
+            return 200, {"Items": [{"Name": self.data_server, "WebId": "D000000", "Path": f"\\\\PIServers[{self.data_server}]"}]}
+        if method == "GET" and path == "/dataservers/D000000/points":
+            start = int(query.get("startindex", ["0"])[0])
+            pattern = query.get("namefilter", ["*"])[0].lower()
+            names = [self.tag(i) for i in range(self.points)]
+            matched = [(i, name) for i, name in enumerate(names) if fnmatch.fnmatch(name.lower(), pattern)]
+            matched = matched[start:start + int(query.get("maxcount", ["1000"])[0])]
+            return 200, {"Items": [{"WebId": f"P{i:06d}", "Name": name, "Path": f"\\\\{self.data_server}\\{name}"} for i, name in matched]}
+        if method == "GET" and path == "/points/multiple":
+            return self._multiple(query.get("path", []), self.point_paths, "P", lambda p: p.rsplit("\\", 1)[1])
+        if method == "GET" and path == "/assetservers":
+            return 200, {"Items": [{"Name": self.asset_server, "WebId": "S000000"}]}
+        if method == "GET" and path == "/assetservers/S000000/assetdatabases":
+            return 200, {"Items": [{"Name": self.asset_database, "WebId": "B000000"}]}
+        if method == "GET" and path == "/assetdatabases/B000000/elements":
+            return 200, {"Items": self._elements(query)}
+        if method == "GET" and re.fullmatch(r"/elements/E\d{6}/elements", path):
+            return 200, {"Items": []}
+        if method == "GET" and path == "/elements/multiple":
+            return self._multiple(query.get("path", []), self.element_paths, "E", lambda p: p.rsplit("\\", 1)[1])
+        if method == "GET" and path == "/attributes/multiple":
+            return self._multiple(query.get("path", []), self.attribute_paths, "A", lambda p: p.rsplit("|", 1)[1])
+
+        match = re.fullmatch(r"/streams/([^/]+)/(\w+)", path)
+        if match:
+            index = self._index(match.group(1))
+            if index is None:
+                return 404, {"Errors": [f"Stream '{match.group(1)}' was not found."]}
+            if method == "POST":
+                loads(body)
+                return 202, None
+            items = self._stream(index, match.group(2), query)
+            return 200, items if match.group(2) == "value" else {"Items": items}
+
+        if path == "/streamsets/updates":
+            return self._updates(method, query)
+        match = re.fullmatch(r"/streamsets/(\w+)", path)
+        if match and method == "POST":
+            streams = loads(body)
+            items = [{"Substatus": 202 if self._index(s.get("WebId", "")) is not None else 404} for s in streams]
+            if all(item["Substatus"] == 202 for item in items):
+                return 202, None
+            return 207, {"Items": items}
+        if match:
+            streams = []
+            for webid in query.get("webid", []):
+                index = self._index(webid)
+                if index is None:
+                    streams.append({"WebId": webid, "Exception": {"Errors": [f"Stream '{webid}' was not found."]}})
+                    continue
+                items = self._stream(index, match.group(1), query)
+                stream = {"WebId": webid, "Name": self.tag(index), "Path": f"\\\\{self.data_server}\\{self.tag(index)}"}
+                stream["Value" if match.group(1) == "value" else "Items"] = items
+                streams.append(stream)
+            return (207 if any("Exception" in s for s in streams) else 200), {"Items": streams}
+
+        if method == "POST" and path == "/batch":
+            return 207, self._batch(loads(body))
+        return 404, {"Errors": [f"Resource '{path}' is not supported by the mock server."]}
+
+    def _updates(self, method: str, query: dict):
+        now = pd.Timestamp.now(tz="UTC")
+        items = []
+        if method == "POST":
+            for webid in query.get("webid", []):
+                if self._index(webid) is None:
+                    items.append({"Source": webid, "Status": "Failed", "Exception": {"Errors": [f"Stream '{webid}' was not found."]}})
+                else:
+                    items.append({"Source": webid, "Status": "Succeeded", "LatestMarker": f"{webid}:{now.value}"})
+            return 207, {"Items": items}
+        for marker in query.get("marker", []):
+            webid, _, since = marker.partition(":")
+            index = self._index(webid)
+            if index is None or not since.isdigit():
+                items.append({"Source": webid, "Exception": {"Errors": [f"Marker '{marker}' is not valid."]}})
+                continue
+            ns = self._grid(pd.Timestamp(int(since), tz="UTC") + pd.Timedelta(1), now, self.event_interval)
+            events = self._items(index, ns)
+            for event in events:
+                event["Action"] = "Add"
+            items.append({"Source": webid, "SourceName": self.tag(index), "LatestMarker": f"{webid}:{now.value}", "Events": events})
+        return 200, {"Items": items}
+
+    def _batch(self, requests: dict) -> dict:
+        results = {}
+        pending = dict(requests)
+        while pending:
+            ready = [key for key, request in pending.items() if all(parent in results for parent in request.get("ParentIds", []))]
+            if not ready:
+                for key in pending:
+                    results[key] = {"Status": 409, "Content": {"Errors": ["Unresolved or circular ParentIds."]}}
+                break
+            for key in ready:
+                request = pending.pop(key)
+                method = request.get("Method", "GET")
+                content = request.get("Content", "").encode() if isinstance(request.get("Content"), str) else b""
+                if "RequestTemplate" in request:
+                    parameters = [_json_path(results, parameter) for parameter in request.get("Parameters", [])]
+                    template = request["RequestTemplate"]["Resource"]
+                    items = []
+                    for values in zip(*parameters) if parameters else []:
+                        resource = template
+                        for i, value in enumerate(values):
+                            resource = resource.replace(f"{{{i}}}", str(value))
+                        status, document, _ = self.handle(method, urlsplit(resource)._replace(scheme="", netloc="").geturl(), content)
+                        items.append({"Status": status, "Headers": {}, "Content": document})
+                    results[key] = {"Status": 207, "Headers": {}, "Content": {"Items": items}}
+                else:
+                    resource = request.get("Resource", "")
+                    for i, parameter in enumerate(request.get("Parameters", [])):
+                        values = _json_path(results, parameter)
+                        resource = resource.replace(f"{{{i}}}", str(values[0]) if values else "")
+                    status, document, _ = self.handle(method, urlsplit(resource)._replace(scheme="", netloc="").geturl(), content)
+                    results[key] = {"Status": status, "Headers": {}, "Content": document}
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic PI Web API data for offline testing and benchmarks.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--event-interval", type=float, default=60.0, help="Seconds between two recorded values.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every request is delayed.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status.")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--no-extra-fields", action="store_true", help="Only return Timestamp and Value.")
+    parser.add_argument("--gzip", action="store_true", help="Compress responses for clients that accept gzip.")
+    args = parser.parse_args()
+    mock = MockPIWebAPI(points=args.points, event_interval=args.event_interval, latency=args.latency,
+                        error_rate=args.error_rate, error_status=args.error_status, extra_fields=not args.no_extra_fields,
+                        compress=args.gzip, port=args.port)
+    print(f"Serving {args.points} points at {mock.base_url}", flush=True)
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from pi_modules import PIDataServerClient
+from .mock_server import MockPIWebAPI
+
+START = "2024-01-01T00:00:00Z"
+
+METHODS = {
+    "webids": lambda client, tags, end: client.webids("PIMOCK", tags),
+    "compressed": lambda client, tags, end: client.compressed_data("PIMOCK", tags, START, end),
+    "summary": lambda client, tags, end: client.summary_data("PIMOCK", tags, START, end, "1h", "Average"),
+    "summary4": lambda client, tags, end: client.summary_data("PIMOCK", tags, START, end, "1h", ["Average", "Minimum", "Maximum", "Count"]),
+    "interpolated": lambda client, tags, end: client.interpolated_data("PIMOCK", tags, START, end, "10m"),
+    "plot": lambda client, tags, end: client.plot_data("PIMOCK", tags, START, end, 20),
+}
+
+MODES = {
+    "streams": {},
+    "streamsets": {"use_streamsets": True},
+    "batch": {"use_batch": True},
+    "lean": {"use_streamsets": True, "lean": True},
+}
+
+
+def _serve(options: dict, queue) -> None:
+    mock = MockPIWebAPI(**options)
+    queue.put(mock.base_url)
+    mock.server.serve_forever()
+
+
+def _measure(base_url: str, method: str, mode: str, tags: list, end: str, max_workers: int) -> dict:
+    client = PIDataServerClient(base_url, auth=None, max_workers=max_workers, **MODES[mode])
+    if method != "webids":
+        # Data retrievals are measured with resolved webids, lookups are measured on their own
+        client.webids("PIMOCK", tags)
+    counters = {"requests": 0, "bytes": 0}
+
+    def count(response, *args, **kwargs):
+        counters["requests"] += 1
+        counters["bytes"] += int(response.headers.get("Content-Length") or len(response.content))
+
+    client.session.hooks["response"].append(count)
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = METHODS[method](client, tags, end)
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    client.session.close()
+    return {
+        "method": method,
+        "mode": mode,
+        "tags": len(tags),
+        "wall_s": round(wall, 4),
+        "requests": counters["requests"],
+        "bytes": counters["bytes"],
+        "peak_mb": round(peak / 2 ** 20, 2),
+        "rows": len(result) if result is not None else 0,
+    }
+
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="Benchmark the PI Web API client against the offline mock server.")
+    parser.add_argument("--tags", default="10,1000,10000", help="Comma-separated tag counts.")
+    parser.add_argument("--methods", default=",".join(METHODS), help="Comma-separated retrieval methods.")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated request modes.")
+    parser.add_argument("--hours", type=float, default=1.0, help="Length of the retrieved time range in hours.")
+    parser.add_argument("--event-interval", type=float, default=60.0, help="Seconds between two recorded values.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the server delays every request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--gzip", action="store_true", help="Let the server compress responses.")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file.")
+    args = parser.parse_args(argv)
+
+    counts = [int(count) for count in args.tags.split(",")]
+    end = (pd.Timestamp(START) + pd.Timedelta(hours=args.hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    options = {"points": max(counts), "event_interval": args.event_interval, "latency": args.latency,
+               "error_rate": args.error_rate, "compress": args.gzip}
+    # The server runs in its own process so its time and memory do not count towards the client
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(options, queue), daemon=True)
+    server.start()
+    results = []
+    try:
+        base_url = queue.get(timeout=60)
+        for count in counts:
+            tags = [MockPIWebAPI.tag(i) for i in range(count)]
+            for method in args.methods.split(","):
+                # Lookups do not depend on the request mode
+                for mode in args.modes.split(",")[:1] if method == "webids" else args.modes.split(","):
+                    results.append(_measure(base_url, method, mode, tags, end, args.max_workers))
+    finally:
+        server.terminate()
+        server.join()
+
+    table = pd.DataFrame(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = pd.DataFrame(json.load(f))
+        keys = ["method", "mode", "tags"]
+        table = table.merge(baseline[keys + ["wall_s", "requests", "bytes"]], on=keys, how="left", suffixes=("", "_base"))
+        table["speedup"] = (table["wall_s_base"] / table["wall_s"]).round(2)
+        table = table.drop(columns=["wall_s_base"])
+    print(table.to_string(index=False))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -55,3 +55,6 @@ output = data_summary.to_csv("summary_data.csv", index=False)
 #pull interpolated data from the server
 #data_interpolated = conn.interpolated_data(dataserver=database, taglist=taglist, starttime=starttime, endtime=endtime, interval='5m')
 
+#stream compressed data to Parquet without holding the whole extract in memory
+#from pi_modules.sinks import write_parquet
+#rows = write_parquet(conn.iter_compressed(dataserver=database, taglist=taglist, starttime=starttime, endtime=endtime), "compressed_data.parquet")
@@ -1 +1,4 @@
-from .clients import PIDataServerClient, PIAssetServerClient
\ No newline at end of file
+from .clients import PIDataServerClient, PIAssetServerClient
+from .aio import AsyncPIDataServerClient
+from .metrics import MetricsCollector, CallMetrics
+from .decode import QUALITY_BAD, QUALITY_QUESTIONABLE, QUALITY_SUBSTITUTED, QUALITY_ANNOTATED, QUALITY_MISSING
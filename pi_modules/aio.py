@@ -0,0 +1,55 @@
+import asyncio
+from .clients import PIDataServerClient
+
+
+class AsyncPIDataServerClient:
+    def __init__(self, *args, max_concurrency: int = 4, **kwargs):
+        """ Initialize the asyncio PI Data Server Client.
+        Calls are run on worker threads so they never block the event loop.
+        :param max_concurrency: The maximum number of client calls running at the same time.
+        :param args: Positional arguments passed to PIDataServerClient.
+        :param kwargs: Keyword arguments passed to PIDataServerClient.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.client = PIDataServerClient(*args, **kwargs)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, func, *args, **kwargs):
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def webids(self, dataserver: str, taglist: list):
+        """
+        Retrieve webids for the specified tags from the given data server.
+        See PIDataServerClient.webids.
+        """
+        return await self._run(self.client.webids, dataserver, taglist)
+
+    async def compressed_data(self, *args, **kwargs):
+        """
+        Retrieve compressed data from the specified data server for the given tags.
+        See PIDataServerClient.compressed_data.
+        """
+        return await self._run(self.client.compressed_data, *args, **kwargs)
+
+    async def summary_data(self, *args, **kwargs):
+        """
+        Retrieve summary data from the specified data server for the given tags.
+        See PIDataServerClient.summary_data.
+        """
+        return await self._run(self.client.summary_data, *args, **kwargs)
+
+    async def interpolated_data(self, *args, **kwargs):
+        """
+        Retrieve interpolated data from the specified data server for the given tags.
+        See PIDataServerClient.interpolated_data.
+        """
+        return await self._run(self.client.interpolated_data, *args, **kwargs)
+
+    async def plot_data(self, *args, **kwargs):
+        """
+        Retrieve values for plotting the given tags, downsampled by the server.
+        See PIDataServerClient.plot_data.
+        """
+        return await self._run(self.client.plot_data, *args, **kwargs)
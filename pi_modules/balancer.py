@@ -0,0 +1,92 @@
+import threading
+from urllib.parse import urlparse
+from .retry import CircuitBreaker
+
+
+class Node:
+    def __init__(self, base_url: str, session, breaker: CircuitBreaker):
+        """ Initialize a PI Web API node of a pool.
+        :param base_url: The base URL of the node.
+        :param session: The requests.Session used for the node.
+        :param breaker: The circuit breaker of the node.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.host = urlparse(self.base_url).netloc
+        self.session = session
+        self.breaker = breaker
+        self.latency = None
+        self.in_flight = 0
+
+    def __repr__(self) -> str:
+        latency = "n/a" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"Node({self.base_url}, {self.breaker.state}, latency {latency}, {self.in_flight} in flight)"
+
+
+class NodePool:
+    def __init__(self, nodes: list, smoothing: float = 0.2):
+        """ Initialize a pool of PI Web API nodes serving the same PI systems.
+        Requests go to the healthy node with the lowest expected wait, i.e. its smoothed latency
+        times the number of requests it would then have in flight.
+        :param nodes: The nodes of the pool.
+        :param smoothing: The weight of a new latency sample in the moving average of a node.
+        """
+        if not nodes:
+            raise ValueError("At least one node must be provided.")
+        self.nodes = nodes
+        self.smoothing = smoothing
+        self._affinity = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _score(node: Node) -> tuple:
+        # Nodes without a latency sample yet are tried first so every node gets measured
+        return ((node.in_flight + 1) * (node.latency or 0.0), node.in_flight)
+
+    def select(self, exclude: set = (), affinity=None) -> Node:
+        """
+        Choose the node of the next request and count the request as in flight on it.
+        :param exclude: Nodes that must not be chosen (e.g. because they already failed the request).
+        :param affinity: A key whose requests stay on the same node while it is healthy (e.g. for update markers).
+        :return: The node, or None if every node is excluded.
+        """
+        with self._lock:
+            node = self._affinity.get(affinity) if affinity is not None else None
+            if node is None or node in exclude or node.breaker.state != "closed":
+                candidates = [n for n in self.nodes if n not in exclude]
+                if not candidates:
+                    return None
+                # Nodes with an open circuit are only chosen when nothing else is left
+                healthy = [n for n in candidates if n.breaker.state != "open"] or candidates
+                node = min(healthy, key=self._score)
+                if affinity is not None:
+                    self._affinity[affinity] = node
+            node.in_flight += 1
+            return node
+
+    def release(self, node: Node, latency: float = None) -> None:
+        """
+        Mark a request of a node as finished.
+        :param node: The node the request was sent to.
+        :param latency: The latency of the request in seconds (None if it failed).
+        """
+        with self._lock:
+            node.in_flight -= 1
+            if latency is not None:
+                node.latency = latency if node.latency is None else (1 - self.smoothing) * node.latency + self.smoothing * latency
+
+
+def rebase(document, old: str, new: str):
+    """
+    Replace the base URL of every URL in a request body, e.g. the resources of a /batch request.
+    :param document: The JSON document.
+    :param old: The base URL the document was built with.
+    :param new: The base URL of the node the request is sent to.
+    :return: The rebased document.
+    """
+    if isinstance(document, str):
+        return new + document[len(old):] if document.startswith(old) else document
+    if isinstance(document, dict):
+        return {key: rebase(value, old, new) for key, value in document.items()}
+    if isinstance(document, list):
+        return [rebase(value, old, new) for value in document]
+    return document
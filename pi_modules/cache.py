@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+
+
+class WebIDCache:
+    def __init__(self, path: str = None, ttl: float = 86400):
+        """ Initialize the WebID cache.
+        :param path: Path of an SQLite file used to persist entries between runs (memory only if None).
+        :param ttl: Number of seconds an entry stays valid after it was stored.
+        """
+        self.path = path
+        self.ttl = ttl
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS webids ("
+                "scope TEXT NOT NULL, name TEXT NOT NULL, webid TEXT NOT NULL, expires REAL NOT NULL, "
+                "PRIMARY KEY (scope, name))"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _key(name: str) -> str:
+        # PI point and server names are case-insensitive
+        return str(name).lower()
+
+    def get(self, scope: str, name: str):
+        """
+        Get a single cached WebID.
+        :param scope: The namespace of the entry (e.g. the data server name).
+        :param name: The name of the object.
+        :return: The WebID, or None if it is not cached or has expired.
+        """
+        return self.get_many(scope, [name]).get(name)
+
+    def get_many(self, scope: str, names: list) -> dict:
+        """
+        Get the cached WebIDs for a list of names.
+        :param scope: The namespace of the entries (e.g. the data server name).
+        :param names: The names of the objects.
+        :return: A dictionary of name to WebID for every name that is cached and still valid.
+        """
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for name in names:
+                entry = self._memory.get((scope, self._key(name)))
+                if entry and entry[1] > now:
+                    found[name] = entry[0]
+                else:
+                    missing.append(name)
+            if self._db is None or not missing:
+                return found
+            keys = {}
+            for name in missing:
+                keys.setdefault(self._key(name), []).append(name)
+            key_list = list(keys)
+            # Stay below SQLite's default limit on bound variables
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT name, webid, expires FROM webids WHERE scope = ? AND expires > ? "
+                    f"AND name IN ({','.join('?' * len(chunk))})",
+                    [scope, now, *chunk],
+                ).fetchall()
+                for key, webid, expires in rows:
+                    self._memory[(scope, key)] = (webid, expires)
+                    for name in keys[key]:
+                        found[name] = webid
+        return found
+
+    def set(self, scope: str, name: str, webid: str) -> None:
+        """
+        Store a single WebID.
+        :param scope: The namespace of the entry (e.g. the data server name).
+        :param name: The name of the object.
+        :param webid: The WebID of the object.
+        """
+        self.set_many(scope, {name: webid})
+
+    def set_many(self, scope: str, mapping: dict) -> None:
+        """
+        Store several WebIDs at once.
+        :param scope: The namespace of the entries (e.g. the data server name).
+        :param mapping: A dictionary of name to WebID.
+        """
+        if not mapping:
+            return
+        expires = time.time() + self.ttl
+        rows = [(scope, self._key(name), webid, expires) for name, webid in mapping.items()]
+        with self._lock:
+            for _, key, webid, _ in rows:
+                self._memory[(scope, key)] = (webid, expires)
+            if self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO webids VALUES (?, ?, ?, ?)", rows)
+                self._db.commit()
+
+    def invalidate(self, scope: str = None, names: list = None) -> None:
+        """
+        Remove entries from the cache.
+        :param scope: Only remove entries of this namespace (all namespaces if None).
+        :param names: Only remove these names (all names of the scope if None).
+        """
+        with self._lock:
+            if scope is None:
+                self._memory.clear()
+                if self._db is not None:
+                    self._db.execute("DELETE FROM webids")
+            elif names is None:
+                self._memory = {k: v for k, v in self._memory.items() if k[0] != scope}
+                if self._db is not None:
+                    self._db.execute("DELETE FROM webids WHERE scope = ?", (scope,))
+            else:
+                keys = [self._key(name) for name in names]
+                for key in keys:
+                    self._memory.pop((scope, key), None)
+                if self._db is not None:
+                    self._db.executemany("DELETE FROM webids WHERE scope = ? AND name = ?", [(scope, key) for key in keys])
+            if self._db is not None:
+                self._db.commit()
+
+    def purge(self) -> None:
+        """
+        Remove all expired entries from the cache.
+        """
+        now = time.time()
+        with self._lock:
+            self._memory = {k: v for k, v in self._memory.items() if v[1] > now}
+            if self._db is not None:
+                self._db.execute("DELETE FROM webids WHERE expires <= ?", (now,))
+                self._db.commit()
+
+    def close(self) -> None:
+        """
+        Close the underlying SQLite connection.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
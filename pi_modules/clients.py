@@ -1,146 +1,1156 @@
 import requests
 import pandas as pd
-import json
 import os
 import logging
 import requests_kerberos
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+import contextvars
+import math
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+from .cache import WebIDCache
+from .times import to_timestamp, to_pi_time, to_timedelta
+from .store import TimeSeriesStore
+from .retry import RetryPolicy, CircuitBreaker, CircuitOpenError, AdaptiveLimiter
+from .balancer import Node, NodePool, rebase
+from .decode import decode_streams, decode_wide, decode_summaries, summary_columns, widen, loads, QUALITY_MISSING
+from .metrics import endpoint_of, instrumented, current_call
 
 
+# selectedFields projections of lean mode
+_LOOKUP_FIELDS = "Items.Identifier;Items.Object.WebId;Items.Exception"
+_SERVER_FIELDS = "Items.Name;Items.WebId"
+_VALUE_FIELDS = "Items.Timestamp;Items.Value"
 
+# Seconds between checks of a half-open circuit whose trial request is in flight
+_TRIAL_POLL = 0.05
 
-class PIAssetServerClient:
-    def __init__(self, base_url: str, auth: str = "Kerberos", verify: bool =True, username: str =None, password: str =None, asset_server: str = None, asset_database: str = None):
-        """ Initialize the PI Asset Server Client.
-        :param base_url: The base URL of the PI Asset Server. 
+
+def _chunk_query_values(values: list, key: str, budget: int, max_items: int = None):
+    """
+    Split values into chunks whose repeated `key=value` query string fits in the given budget.
+    :param values: The values to split.
+    :param key: The name of the repeated query parameter.
+    :param budget: The maximum number of characters available for the repeated parameter.
+    :param max_items: The maximum number of values per chunk (unlimited if None).
+    :return: A generator of lists of values.
+    """
+    chunk = []
+    length = 0
+    for value in values:
+        size = len(key) + len(quote(str(value), safe="")) + 2
+        if chunk and (length + size > budget or (max_items and len(chunk) >= max_items)):
+            yield chunk
+            chunk = []
+            length = 0
+        chunk.append(value)
+        length += size
+    if chunk:
+        yield chunk
+
+
+def _streamset_params(endpoint: str, params: dict) -> dict:
+    """
+    Adapt the query parameters of a stream request to the streamset form of the same endpoint.
+    :param endpoint: The stream endpoint (e.g. "recorded", "summary", "value").
+    :param params: The query parameters of the stream request.
+    :return: The query parameters of the streamset request.
+    """
+    params = dict(params)
+    if "selectedFields" in params:
+        # Project the per-stream fields one level deeper and keep the WebId to match streams to tags
+        fields = params["selectedFields"].split(";")
+        nested = "Items.Value." if endpoint == "value" else "Items."
+        params["selectedFields"] = ";".join(["Items.WebId", "Items.Exception"] + [f"{nested}{field}" for field in fields])
+    return params
+
+
+def _clean_ranges(start: pd.Timestamp, end: pd.Timestamp, failed: list) -> list:
+    """
+    Split a fetched time range into the parts outside the ranges whose requests failed.
+    :param start: The start of the fetched range.
+    :param end: The end of the fetched range.
+    :param failed: A list of (start, end) tuples of failed ranges.
+    :return: A list of (start, end, closed) tuples; values at the end of a part belong to it only if closed is set.
+    """
+    ranges = []
+    position = start
+    for failed_start, failed_end in sorted(failed):
+        if failed_start > position:
+            ranges.append((position, failed_start, False))
+        position = max(position, failed_end)
+    if position < end or not failed:
+        ranges.append((position, end, True))
+    return ranges
+
+
+
+class _PIWebAPIClient:
+    """Session, request and stream retrieval machinery shared by the PI Data Server and PI Asset Server clients."""
+
+    def __init__(self, base_url, auth: str = "Kerberos", verify: bool =True, username: str =None, password: str =None,
+                 cache_path: str = None, cache_ttl: float = 86400, max_url_length: int = 2048,
+                 use_streamsets: bool = False, streamset_size: int = 100, max_workers: int = 1, value_dtype: str = "float64",
+                 store_path: str = None, hot_tail: str = "1h", retry_policy: RetryPolicy = None,
+                 circuit_breaker_threshold: int = 5, circuit_breaker_timeout: float = 30.0, use_batch: bool = False,
+                 hooks: list = None, lean: bool = False, time_zone: str = None):
+        """ Initialize the client.
+        :param base_url: The base URL of the PI Web API, or a list of the base URLs of several PI Web API nodes serving
+            the same PI systems. Requests are then spread over the nodes by latency and fail over to healthy nodes.
         :param auth: The authentication method to use ("Kerberos" or "Basic").
         :param verify: Whether to verify SSL certificates (default is True).
         :param username: The username for basic authentication (required if auth is "Basic").
         :param password: The password for basic authentication (required if auth is "Basic").
-        :param asset_server: The name of the asset server.
-        :param asset_database: The name of the asset database.
+        :param cache_path: Path of an SQLite file used to persist resolved WebIDs between runs (memory only if None).
+        :param cache_ttl: Number of seconds a resolved WebID is reused before it is looked up again.
+        :param max_url_length: The maximum length of a request URL, used to chunk multi-item requests.
+        :param use_streamsets: Whether to retrieve data for many tags per request through ad hoc streamsets.
+        :param streamset_size: The maximum number of tags per streamset request.
+        :param max_workers: The number of requests to run concurrently (1 runs them serially).
+        :param value_dtype: The dtype of the Value column ("float64" or "float32").
+        :param store_path: Path of an SQLite file keeping retrieved values, so later calls only fetch uncovered time ranges.
+        :param hot_tail: Duration before the current time that is always fetched again when store_path is set.
+        :param retry_policy: The retry policy of all requests (RetryPolicy() if None).
+        :param circuit_breaker_threshold: The number of consecutive failures after which requests to a host fail fast.
+        :param circuit_breaker_timeout: The number of seconds before a host with an open circuit is tried again.
+        :param use_batch: Whether compressed_data, summary_data, interpolated_data and plot_data resolve tags and read
+            data in /batch round trips of up to streamset_size tags.
+        :param hooks: Functions called with every instrumentation event, e.g. a MetricsCollector.
+        :param lean: Whether to minimize payloads: every request selects only the fields the client reads, WebIDs are
+            requested as IDOnly and gzip is requested explicitly. Values then carry no Good/Questionable/... flags.
+        :param time_zone: The time zone (e.g. "Europe/Berlin") of relative times such as "T-1d" and of time strings
+            without an offset, the time zone of this machine if None. Times are resolved by the client and sent as UTC,
+            instead of being evaluated in the time zone of the PI Web API server.
         """
-        self.base_url = base_url
+        base_urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        if not base_urls:
+            raise ValueError("At least one base URL must be provided.")
+        # URLs are built against the first node and moved to the chosen node when a request is sent
+        self.base_url = base_urls[0].rstrip("/")
         self.username = username
         self.password = password
-        self.logger = logging.getLogger("PIAssetServerClient")
+        self.logger = logging.getLogger(type(self).__name__)
         logging.basicConfig(level=logging.INFO)
-        self.session = requests.Session()
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        self.max_workers = max_workers
+        self.time_zone = time_zone
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_timeout = circuit_breaker_timeout
+        # Starts at max_workers and shrinks while the server pushes back
+        self.limiter = AdaptiveLimiter(max_workers)
+        if value_dtype not in ("float64", "float32"):
+            raise ValueError("value_dtype must be 'float64' or 'float32'.")
+        self.value_dtype = value_dtype
         if auth == "Kerberos":
             self.logger.info("Using Kerberos authentication.")
-            self.session.auth = requests_kerberos.HTTPKerberosAuth(mutual_authentication=requests_kerberos.DISABLED)
         elif auth == "Basic":
             if not username or not password:
                 raise ValueError("Username and password must be provided for basic authentication.")
-            self.logger.info("Using Kerberos authentication.")
-            self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = verify
-        if self.session.verify == False:
+            self.logger.info("Using Basic authentication.")
+        if verify == False:
             # Suppress warnings about unverified HTTPS requests
             warnings.filterwarnings("ignore", message="Unverified HTTPS request")
-        self._getAssetServerID(asset_server)
-        if not self.AssetServerID:
-            raise ValueError(f"Asset server '{asset_server}' not found.")
-        self._getAssetDatabaseID(asset_database)
-        if not self.AssetDBID:
-            raise ValueError(f"Asset database '{asset_database}' not found.")
-        
-    def _getAssetServerID(self, data_server_name: str) -> None:
+        # One session per node, so every node keeps its own pool of authenticated connections
+        self.pool = NodePool([
+            Node(url, self._new_session(auth, verify, username, password, lean),
+                 CircuitBreaker(circuit_breaker_threshold, circuit_breaker_timeout))
+            for url in base_urls
+        ])
+        self.max_url_length = max_url_length
+        self.webid_cache = WebIDCache(path=cache_path, ttl=cache_ttl)
+        self.store = TimeSeriesStore(store_path, hot_tail) if store_path else None
+        self.use_streamsets = use_streamsets
+        self.use_batch = use_batch
+        self.streamset_size = streamset_size
+        self.hooks = list(hooks or [])
+        self.last_metrics = None
+        self.lean = lean
+        self._warned_uncompressed = False
+
+    def _new_session(self, auth: str, verify: bool, username: str, password: str, lean: bool) -> requests.Session:
+        """
+        Create the session of one PI Web API node.
+        """
+        session = requests.Session()
+        # Size the connection pool so every worker can keep its own connection alive
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=max(self.max_workers, 10))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if auth == "Kerberos":
+            session.auth = requests_kerberos.HTTPKerberosAuth(mutual_authentication=requests_kerberos.DISABLED)
+        elif auth == "Basic":
+            session.auth = HTTPBasicAuth(username, password)
+        session.verify = verify
+        if lean:
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The session of the first node.
+        """
+        return self.pool.nodes[0].session
+
+    @session.setter
+    def session(self, session: requests.Session) -> None:
+        self.pool.nodes[0].session = session
+
+    def _lean(self, params, fields: str = None):
+        """
+        Add the lean-mode projection and WebID type to the parameters of a request.
+        :param params: The query parameters, as a dictionary or a list of (name, value) tuples.
+        :param fields: The selectedFields projection of the response (a projection already in params is kept).
+        :return: The parameters, unchanged unless lean is set.
+        """
+        if not self.lean:
+            return params
+        extra = [("webIdType", "IDOnly")]
+        if fields:
+            extra.append(("selectedFields", fields))
+        if isinstance(params, dict):
+            return {**dict(extra), **params}
+        return list(params) + extra
+
+    def _scope(self, scope: str) -> str:
+        """
+        Get the WebID cache scope of a lookup; IDOnly WebIDs are cached apart from full ones.
+        :param scope: The scope (a data server name or a collection such as "/dataservers").
+        :return: The scope for the current WebID type.
+        """
+        return f"{scope}#IDOnly" if self.lean else scope
+
+    def add_hook(self, hook) -> None:
+        """
+        Register a function that is called with every instrumentation event (see MetricsCollector).
+        :param hook: The function, taking the event dictionary.
+        """
+        self.hooks.append(hook)
+
+    def _emit(self, event: dict) -> None:
+        """
+        Pass an instrumentation event to the running call summary and the registered hooks.
+        :param event: The event dictionary.
+        """
+        call = current_call()
+        if call is not None:
+            call.record(event)
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                self.logger.error(f"Instrumentation hook {hook!r} failed: {e}")
+
+    def _parse(self, response: requests.Response):
+        """
+        Parse the JSON body of a response and report the time spent.
+        :param response: The response.
+        :return: The parsed JSON document.
+        """
+        started = time.perf_counter()
+        content = loads(response.content)
+        if self.hooks or current_call() is not None:
+            self._emit({"type": "parse", "endpoint": endpoint_of(response.url or "", self.base_url),
+                        "seconds": time.perf_counter() - started, "bytes": len(response.content)})
+        return content
+
+    def _select_node(self, tried: set, affinity=None) -> Node:
+        """
+        Choose the node of the next attempt of a request, skipping nodes whose circuit breaker refuses it.
+        :param tried: Nodes that already failed the request; they are only chosen again when no other node is left.
+        :param affinity: A key whose requests stay on the same node while it is healthy.
+        :return: The node, counted as having the request in flight.
+        """
+        refused = set()
+        for exclude in (tried, set()):
+            while True:
+                node = self.pool.select(exclude | refused, affinity)
+                if node is None:
+                    break
+                if node.breaker.allow():
+                    return node
+                self.pool.release(node)
+                refused.add(node)
+        if len(self.pool.nodes) == 1:
+            node = self.pool.nodes[0]
+            raise CircuitOpenError(f"Circuit breaker open for host '{node.host}' after {node.breaker.failures} failures.")
+        hosts = ", ".join(f"'{node.host}' after {node.breaker.failures} failures" for node in self.pool.nodes)
+        raise CircuitOpenError(f"Circuit breakers open for all hosts: {hosts}.")
+
+    def _request(self, method: str, url: str, affinity=None, idempotent: bool = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the session of a node, retrying transient failures.
+        Every attempt goes to the healthy node with the lowest expected wait and passes its circuit breaker
+        and the adaptive concurrency limit; a failed attempt is retried on another node without waiting.
+        While every circuit is open the request waits for one to let a trial through, each open period using one retry.
+        :param method: The HTTP method.
+        :param url: The URL of the request, built against base_url.
+        :param affinity: A key whose requests stay on the same node while it is healthy (e.g. for update markers).
+        :param idempotent: Whether the request only reads, so it is retried like a GET (GET requests only if None).
+        :param kwargs: Keyword arguments passed to requests.Session.request.
+        :return: The response of the last attempt.
+        """
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else None
+        endpoint = endpoint_of(url, self.base_url)
+        tried = set()
+        attempt = 0
+        while True:
+            try:
+                if path is not None:
+                    node = self._select_node(tried, affinity)
+                else:
+                    # URLs outside base_url are not balanced and always use the first node's session
+                    node = self.pool.select(set(self.pool.nodes[1:]))
+                    if not node.breaker.allow():
+                        self.pool.release(node)
+                        raise CircuitOpenError(f"Circuit breaker open for host '{node.host}' after {node.breaker.failures} failures.")
+            except CircuitOpenError as e:
+                # The request was not sent, so whatever its method it waits for a circuit to let it through
+                nodes = self.pool.nodes if path is not None else self.pool.nodes[:1]
+                first = min(nodes, key=lambda n: n.breaker.remaining())
+                if first.breaker.remaining() == 0:
+                    # A trial request is in flight, its outcome decides whether the circuit closes
+                    time.sleep(_TRIAL_POLL)
+                    continue
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = max(self.retry_policy.delay(attempt), first.breaker.remaining())
+                self._emit({"type": "retry", "method": method, "endpoint": endpoint, "host": first.host, "reason": "CircuitOpen", "delay": delay})
+                self.logger.warning(f"{e} Retrying {method} {url} in {delay:.1f}s.")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            target = node.base_url + path if path is not None else url
+            options = kwargs
+            if node.base_url != self.base_url and isinstance(kwargs.get("json"), (dict, list)):
+                # Batch requests name their resources by URL
+                options = {**kwargs, "json": rebase(kwargs["json"], self.base_url, node.base_url)}
+            self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = node.session.request(method, target, **options)
+            except requests.exceptions.RequestException as e:
+                self.limiter.release(overloaded=True)
+                self.pool.release(node)
+                node.breaker.record_failure()
+                self._emit({"type": "request", "method": method, "endpoint": endpoint, "host": node.host, "status": type(e).__name__,
+                            "seconds": time.monotonic() - started, "bytes_in": 0, "bytes_out": 0, "attempt": attempt})
+                if not self.retry_policy.should_retry(method, attempt, error=e, idempotent=idempotent):
+                    raise
+                tried.add(node)
+                delay = self._failover_delay(tried, attempt)
+                self._emit({"type": "retry", "method": method, "endpoint": endpoint, "host": node.host, "reason": type(e).__name__, "delay": delay})
+                self.logger.warning(f"{method} {target} failed ({e}), retrying in {delay:.1f}s.")
+            else:
+                latency = time.monotonic() - started
+                self.limiter.release(latency, overloaded=response.status_code in (409, 429, 503))
+                failed = response.status_code >= 500 or response.status_code == 429
+                self.pool.release(node, None if failed else latency)
+                body = response.request.body if response.request is not None else None
+                self._emit({"type": "request", "method": method, "endpoint": endpoint, "host": node.host, "status": response.status_code,
+                            "seconds": latency, "attempt": attempt,
+                            # Content-Length is the size on the wire, before gzip decoding
+                            "bytes_in": int(response.headers.get("Content-Length") or len(response.content)),
+                            "bytes_out": len(body) if body else 0})
+                if self.lean and not self._warned_uncompressed and len(response.content) > 4096 and "Content-Encoding" not in response.headers:
+                    self._warned_uncompressed = True
+                    self.logger.warning(f"{node.host} sends uncompressed responses, enable dynamic compression on the PI Web API server.")
+                if failed:
+                    node.breaker.record_failure()
+                else:
+                    node.breaker.record_success()
+                if not self.retry_policy.should_retry(method, attempt, response=response, idempotent=idempotent):
+                    return response
+                tried.add(node)
+                delay = self._failover_delay(tried, attempt, response)
+                self._emit({"type": "retry", "method": method, "endpoint": endpoint, "host": node.host, "reason": response.status_code, "delay": delay})
+                self.logger.warning(f"{method} {target} returned {response.status_code}, retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            attempt += 1
+
+    def _failover_delay(self, tried: set, attempt: int, response=None) -> float:
+        """
+        Get the delay before the next attempt: none while another node can take the request, backoff once all nodes failed it.
+        """
+        if len(tried) < len(self.pool.nodes):
+            return 0.0
+        tried.clear()
+        return self.retry_policy.delay(attempt, response)
+
+    def _lookup_paths(self, resource: str, paths: list) -> dict:
+        """
+        Resolve paths to webids with multi-object lookups.
+        :param resource: The collection to look the paths up in ("points", "attributes" or "elements").
+        :param paths: A list of full paths.
+        :return: A dictionary of path to webid for every path that was found.
+        """
+        url = f"{self.base_url}/{resource}/multiple"
+        originals = {path.lower(): path for path in paths}
+        extra = self._lean([], _LOOKUP_FIELDS)
+        budget = self.max_url_length - len(url) - len(urlencode(extra)) - 2
+
+        def lookup(chunk):
+            response = self._request("GET", url, params=[("path", path) for path in chunk] + extra)
+            # 207 Multi-Status is returned when only some of the paths could be resolved
+            if response.status_code not in (200, 207):
+                self.logger.error(f"Failed to look up {len(chunk)} {resource}: {response.status_code} - {response.text}")
+                return []
+            return self._parse(response)["Items"]
+
+        found = {}
+        for items in self._map(lookup, list(_chunk_query_values(paths, "path", budget))):
+            for item in items:
+                path = originals.get(str(item.get("Identifier", "")).lower())
+                if path is None or not item.get("Object"):
+                    if item.get("Exception"):
+                        self.logger.error(f"Failed to get webid for '{item.get('Identifier')}': {item['Exception'].get('Errors')}")
+                    continue
+                found[path] = item["Object"]["WebId"]
+        return found
+
+    def _map(self, func, items: list) -> list:
+        """
+        Apply a function to every item, fanning out over a thread pool when max_workers is above one.
+        :param func: The function to apply.
+        :param items: The items to apply the function to.
+        :return: A list of results in the order of the items.
+        """
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        # Run every item in a copy of the caller's context so its requests count towards the running call
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(lambda context, item: context.run(func, item), contexts, items))
+
+    def _log_failure(self, tag: str, response) -> None:
+        """
+        Log a failed data request.
+        :param tag: The tag (or tags) the request was made for.
+        :param response: The failed response.
+        """
+        if response.status_code == 409:
+            self.logger.error(f"Conflict error for tag '{tag}': {response.status_code} - {response.text}")
+        elif response.status_code == 400:
+            self.logger.error(f"Bad request for tag '{tag}': {response.status_code} - {response.text}")
+        else:
+            self.logger.error(f"Failed to get data for tag '{tag}': {response.status_code} - {response.text}")
+
+    def _fetch_streams(self, endpoint: str, webids: list, params: dict, streamsets: bool = None) -> list:
+        """
+        Retrieve the values of a stream endpoint for several points.
+        :param endpoint: The stream endpoint (e.g. "recorded", "summary", "interpolated").
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param params: The query parameters of the request.
+        :param streamsets: Whether to use ad hoc streamsets (defaults to the client setting).
+        :return: A list of (tag, items) tuples in the order of the webids.
+        """
+        if streamsets is None:
+            streamsets = self.use_streamsets
+        if not streamsets:
+            def fetch(item):
+                url = f"{self.base_url}/streams/{item['webid']}/{endpoint}"
+                response = self._request("GET", url, params=params)
+                if response.status_code == 200:
+                    content = self._parse(response)
+                    # The value endpoint returns a single value instead of a list of items
+                    return (item['tag'], [content] if endpoint == "value" else content["Items"])
+                self._log_failure(item['tag'], response)
+                return None
+
+            return [result for result in self._map(fetch, webids) if result is not None]
+
+        url = f"{self.base_url}/streamsets/{endpoint}"
+        params = _streamset_params(endpoint, params)
+        tags = {}
+        for item in webids:
+            tags.setdefault(item['webid'], item['tag'])
+        budget = self.max_url_length - len(url) - len(urlencode(params, doseq=True)) - 2
+
+        def fetch_chunk(chunk):
+            response = self._request("GET", url, params=[*params.items(), *[("webId", webid) for webid in chunk]])
+            # 207 Multi-Status is returned when some of the streams failed
+            if response.status_code not in (200, 207):
+                self._log_failure(", ".join(tags[webid] for webid in chunk), response)
+                return []
+            return self._parse(response)["Items"]
+
+        found = {}
+        chunks = list(_chunk_query_values(list(tags), "webId", budget, self.streamset_size))
+        for streams in self._map(fetch_chunk, chunks):
+            for stream in streams:
+                if stream.get("Exception"):
+                    self.logger.error(f"Failed to get data for tag '{tags.get(stream.get('WebId'))}': {stream['Exception'].get('Errors')}")
+                    continue
+                found[stream.get("WebId")] = [stream["Value"]] if endpoint == "value" else stream.get("Items") or []
+        return [(item['tag'], found[item['webid']]) for item in webids if item['webid'] in found]
+
+    def _page_recorded(self, webid: str, tag: str, items: list, params: dict, failed: list = None) -> list:
+        """
+        Keep requesting recorded values from the last returned timestamp until the time range is exhausted.
+        :param webid: The webid of the point.
+        :param tag: The name of the point.
+        :param items: The values returned by the first request.
+        :param params: The query parameters of the first request.
+        :param failed: A list collecting (tag, start, end) tuples of the ranges that could not be read.
+        :return: The complete list of values, or the values up to the first failed page.
+        """
+        url = f"{self.base_url}/streams/{webid}/recorded"
+        max_count = params["maxCount"]
+        items = list(items)
+        page = items
+        while len(page) >= max_count:
+            last = items[-1]["Timestamp"]
+            # Values at the last timestamp are returned again because the next page starts at that timestamp
+            seen = 0
+            while seen < len(items) and items[-1 - seen]["Timestamp"] == last:
+                seen += 1
+            response = self._request("GET", url, params={**params, "startTime": last})
+            if response.status_code != 200:
+                self._log_failure(tag, response)
+                if failed is not None:
+                    failed.append((tag, to_timestamp(last), to_timestamp(params["endTime"])))
+                break
+            page = self._parse(response)["Items"]
+            skip = 0
+            while skip < len(page) and skip < seen and page[skip]["Timestamp"] == last:
+                skip += 1
+            if skip == len(page):
+                if len(page) >= max_count:
+                    self.logger.error(f"More than {max_count} values at {last} for tag '{tag}', increase maxCount to read them all.")
+                    if failed is not None:
+                        failed.append((tag, to_timestamp(last), to_timestamp(params["endTime"])))
+                break
+            items.extend(page[skip:])
+        return items
+
+    def _plan_windows(self, webids: list, starttime: str, endtime: str, points_per_window: int, streamsets: bool = None) -> list:
+        """
+        Plan windows for already resolved webids. See plan_windows.
+        """
+        if points_per_window < 1:
+            raise ValueError("points_per_window must be at least 1.")
+        start, end = (to_timestamp(time) for time in self._times(starttime, endtime))
+        params = {
+            "startTime": to_pi_time(start),
+            "endTime": to_pi_time(end),
+            "summaryType": "Count",
+            "calculationBasis": "EventWeighted",
+            "selectedFields": "Items.Value.Value"
+        }
+        params = self._lean(params)
+        counts = {}
+        for tag, items in self._fetch_streams("summary", webids, params, streamsets):
+            value = items[0]["Value"]["Value"] if items else 0
+            counts[tag] = value if isinstance(value, (int, float)) else 0
+
+        windows = []
+        for item in webids:
+            # Tags without a count are read in a single window
+            n = max(1, math.ceil(counts.get(item['tag'], 0) / points_per_window))
+            bounds = pd.date_range(start, end, periods=n + 1)
+            for i in range(n):
+                windows.append({
+                    'tag': item['tag'],
+                    'webid': item['webid'],
+                    'starttime': to_pi_time(bounds[i]),
+                    'endtime': to_pi_time(bounds[i + 1]),
+                    'last': i == n - 1,
+                })
+        return windows
+
+    def _fetch_recorded(self, webids: list, params: dict, streamsets: bool = None, points_per_window: int = None, failed: list = None) -> list:
+        """
+        Retrieve all recorded values for several points, paging past maxCount.
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param params: The query parameters of the request.
+        :param streamsets: Whether to use ad hoc streamsets (defaults to the client setting).
+        :param points_per_window: Split the range into windows of roughly this many values per tag and fetch them concurrently.
+        :param failed: A list collecting (tag, start, end) tuples of windows and pages that could not be read.
+        :return: A list of (tag, items) tuples in the order of the webids; tags whose first request failed are left out.
+        """
+        if points_per_window:
+            windows = self._plan_windows(webids, params["startTime"], params["endTime"], points_per_window, streamsets)
+
+            def fetch_window(window):
+                url = f"{self.base_url}/streams/{window['webid']}/recorded"
+                window_params = {**params, "startTime": window['starttime'], "endTime": window['endtime']}
+                response = self._request("GET", url, params=window_params)
+                if response.status_code != 200:
+                    self._log_failure(window['tag'], response)
+                    if failed is not None:
+                        failed.append((window['tag'], to_timestamp(window['starttime']), to_timestamp(window['endtime'])))
+                    return []
+                items = self._page_recorded(window['webid'], window['tag'], self._parse(response)["Items"], window_params, failed)
+                if not window['last']:
+                    # The end of a window is the start of the next one, keep boundary values only once
+                    end = to_timestamp(window['endtime'])
+                    while items and to_timestamp(items[-1]["Timestamp"]) >= end:
+                        items.pop()
+                return items
+
+            results = {}
+            for window, items in zip(windows, self._map(fetch_window, windows)):
+                results.setdefault(window['tag'], []).extend(items)
+            return [(tag, items) for tag, items in results.items()]
+
+        results = self._fetch_streams("recorded", webids, params, streamsets)
+        webid_of = {item['tag']: item['webid'] for item in webids}
+        truncated = [i for i, (_, items) in enumerate(results) if len(items) >= params["maxCount"]]
+        pages = self._map(lambda i: self._page_recorded(webid_of[results[i][0]], results[i][0], results[i][1], params, failed), truncated)
+        for i, items in zip(truncated, pages):
+            results[i] = (results[i][0], items)
+        return results
+
+    def _batches(self, webids: list, streamsets: bool = None, batch_size: int = None):
+        """
+        Split resolved webids into the batches yielded by the iter_* methods.
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param streamsets: Whether streamsets are used (defaults to the client setting).
+        :param batch_size: The number of tags per batch (one streamset chunk or one tag per worker if None).
+        :return: A generator of lists of webids.
+        """
+        if streamsets is None:
+            streamsets = self.use_streamsets
+        if batch_size is None:
+            batch_size = self.streamset_size if streamsets else self.max_workers
+        for i in range(0, len(webids), batch_size):
+            yield webids[i:i + batch_size]
+
+    def _frame(self, results: list, values=None, layout: str = "long", types: list = None):
+        """
+        Build a single DataFrame from the values of several tags.
+        :param results: A list of (tag, items) tuples.
+        :param values: A function extracting the value objects from the items (the items themselves if None).
+        :param layout: "long" for a row per value, or "wide" for a (values, quality) tuple of timestamp-indexed matrices.
+        :param types: The summary types of a summary request for several types, decoded into a column per type.
+        :return: A DataFrame with a Tag column followed by the value fields, or the tuple of the wide layout.
+        """
+        for tag, items in results:
+            if not items:
+                self.logger.error(f"No data found for tag '{tag}' in the specified time range.")
+        started = time.perf_counter()
+        if types is not None:
+            df = decode_summaries(results, types, self.value_dtype, layout)
+        elif layout == "wide":
+            df = decode_wide(results, self.value_dtype, values)
+        else:
+            df = decode_streams(results, self.value_dtype, values)
+        self._emit({"type": "decode", "source": "response", "seconds": time.perf_counter() - started, "rows": len(df[0] if layout == "wide" else df)})
+        return df
+
+    @staticmethod
+    def _check_layout(layout: str) -> None:
+        if layout not in ("long", "wide"):
+            raise ValueError("layout must be 'long' or 'wide'.")
+
+    def _cached(self, kind: str, webids: list, params: dict, fetch, values=None, step: str = None, layout: str = "long"):
+        """
+        Retrieve a batch through the local store, fetching only the time ranges it does not cover yet.
+        :param kind: The retrieval type (e.g. "recorded", "summary", "interpolated").
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param params: The query parameters of the retrieval.
+        :param fetch: A function taking webids, params and optionally a list collecting (tag, start, end) tuples of
+            ranges that could not be read, and returning a list of (tag, items) tuples.
+        :param values: A function extracting the value objects from the items (the items themselves if None).
+        :param step: The summary duration or interpolation interval of the retrieval.
+        :param layout: "long" or "wide", see _frame.
+        :return: A DataFrame containing the data of the batch, or the tuple of the wide layout.
+        """
+        if self.store is None:
+            return self._frame(fetch(webids, params), values, layout)
+
+        start = to_timestamp(params["startTime"])
+        end = to_timestamp(params["endTime"])
+        phase = None
+        if step is not None:
+            # Intervals start at the start time, so runs only share stored intervals if their grids have the same phase
+            step = to_timedelta(step)
+            phase = pd.Timedelta(start.value % step.value)
+        key = self.store.key(kind, params, phase)
+
+        # Tags with the same gaps are fetched together so streamsets and concurrency still apply
+        groups = {}
+        for item in webids:
+            gaps = tuple(self.store.gaps(key, item['webid'], start, end, step, phase))
+            groups.setdefault(gaps, []).append(item)
+        covered = len(groups.get((), []))
+        self._emit({"type": "cache", "cache": "store", "hits": covered, "misses": len(webids) - covered})
+        for gaps, points in groups.items():
+            for gap_start, gap_end in gaps:
+                gap_params = {**params, "startTime": to_pi_time(gap_start), "endTime": to_pi_time(gap_end)}
+                failed = []
+                results = fetch(points, gap_params, failed)
+                df = self._frame(results, values)
+                fetched = {tag for tag, _ in results}
+                failures = {}
+                for tag, failed_start, failed_end in failed:
+                    failures.setdefault(tag, []).append((failed_start, failed_end))
+                for item in points:
+                    # Failed requests are not stored so they are retried on the next run
+                    if item['tag'] not in fetched:
+                        continue
+                    part = df[df["Tag"] == item['tag']] if not df.empty else df
+                    if item['tag'] not in failures:
+                        self.store.write(key, item['webid'], part, gap_start, gap_end, step, phase)
+                        continue
+                    # Only the ranges read completely are marked as covered, failed windows and pages stay gaps
+                    for clean_start, clean_end, closed in _clean_ranges(gap_start, gap_end, failures[item['tag']]):
+                        if not part.empty:
+                            inside = (part["Timestamp"] >= clean_start) & ((part["Timestamp"] <= clean_end) if closed else (part["Timestamp"] < clean_end))
+                            piece = part[inside]
+                        else:
+                            piece = part
+                        self.store.write(key, item['webid'], piece, clean_start, clean_end, step, phase)
+        started = time.perf_counter()
+        df = self.store.read(key, webids, start, end, self.value_dtype)
+        if kind == "summary" and not df.empty:
+            # A stored interval starting at the end time lies outside the requested range
+            df = df[df["Timestamp"] < end].reset_index(drop=True)
+        self._emit({"type": "decode", "source": "store", "seconds": time.perf_counter() - started, "rows": len(df)})
+        return widen(df, self.value_dtype) if layout == "wide" else df
+
+    @staticmethod
+    def _collect(batches) -> pd.DataFrame:
+        """
+        Concatenate the DataFrames yielded for several batches into one.
+        """
+        batches = list(batches)
+        if batches and isinstance(batches[0], tuple):
+            # Wide batches share the timestamp index and add columns
+            if len(batches) == 1:
+                return batches[0]
+            values, quality = (pd.concat(parts, axis=1) for parts in zip(*batches))
+            return values, quality.fillna(QUALITY_MISSING).astype("uint8")
+        frames = [df for df in batches if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        if len(frames) == 1:
+            return frames[0]
+        data = pd.concat(frames, ignore_index=True)
+        # Categories differ between batches, so concat falls back to object columns
+        for column in ("Tag", "DigitalState"):
+            if column in data:
+                data[column] = data[column].astype("category")
+        return data
+
+    def _times(self, starttime, endtime) -> tuple:
+        """
+        Resolve the start and end time of a retrieval to the absolute UTC times sent to the server, so that plain,
+        windowed and stored retrievals of the same times cover the same range.
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        return to_pi_time(to_timestamp(starttime, now, self.time_zone)), to_pi_time(to_timestamp(endtime, now, self.time_zone))
+
+    def _recorded_params(self, starttime, endtime, maxCount):
+        starttime, endtime = self._times(starttime, endtime)
+        return self._lean({
+            "startTime": starttime,
+            "endTime": endtime,
+            "maxCount": maxCount
+        }, _VALUE_FIELDS)
+
+    def _iter_compressed(self, webids, params, streamsets, points_per_window, batch_size):
+        for batch in self._batches(webids, streamsets, batch_size):
+            yield self._cached("recorded", batch, params, lambda points, p, failed=None: self._fetch_recorded(points, p, streamsets, points_per_window, failed))
+
+    def _summary_params(self, starttime, endtime, summaryDuration, summaryType, calculationBasis=None, timeType=None):
+        starttime, endtime = self._times(starttime, endtime)
+        params = {
+            "startTime": starttime,
+            "endTime": endtime,
+            "summaryDuration": summaryDuration,
+            "summaryType": summaryType,
+            'selectedFields': "Items.Value.Timestamp;Items.Value.Value"
+        }
+        if not isinstance(summaryType, str):
+            # Several types are requested together and told apart by their Type
+            params["summaryType"] = list(summaryType)
+            params["selectedFields"] = "Items.Type;" + params["selectedFields"]
+            # Minimum and Maximum are stamped at their events by default, which would split an interval over several rows
+            timeType = timeType or "EarliestTime"
+        if calculationBasis:
+            params["calculationBasis"] = calculationBasis
+        if timeType:
+            params["timeType"] = timeType
+        return self._lean(params)
+
+    def _iter_summary(self, webids, params, streamsets, batch_size, layout="long"):
+        types = None if isinstance(params["summaryType"], str) else params["summaryType"]
+        fetch = lambda points, p, failed=None: self._fetch_streams("summary", points, p, streamsets)
+        values = lambda items: [item["Value"] for item in items]
+        for batch in self._batches(webids, streamsets, batch_size):
+            if types is None:
+                yield self._cached("summary", batch, params, fetch, values, step=params["summaryDuration"], layout=layout)
+            elif self.store is None:
+                yield self._frame(fetch(batch, params), layout=layout, types=types)
+            else:
+                # The store holds a single value per timestamp, so every summary type is kept under its own key
+                parts = [self._cached("summary", batch, {**params, "summaryType": kind}, fetch, values, step=params["summaryDuration"]).assign(Type=kind)
+                         for kind in types]
+                data = pd.concat(parts, ignore_index=True)
+                if not data.empty:
+                    data["Tag"] = pd.Categorical(data["Tag"], categories=list(dict.fromkeys(item['tag'] for item in batch)))
+                yield summary_columns(data, types, self.value_dtype, layout)
+
+    def _interpolated_params(self, starttime, endtime, interval):
+        starttime, endtime = self._times(starttime, endtime)
+        return self._lean({
+            "startTime": starttime,
+            "endTime": endtime,
+            "interval": interval
+        }, _VALUE_FIELDS)
+
+    def _plot_params(self, starttime, endtime, intervals):
+        if intervals < 1:
+            raise ValueError("intervals must be at least 1.")
+        starttime, endtime = self._times(starttime, endtime)
+        return self._lean({
+            "startTime": starttime,
+            "endTime": endtime,
+            "intervals": intervals
+        }, _VALUE_FIELDS)
+
+    def _iter_interpolated(self, webids, params, streamsets, batch_size, layout="long"):
+        for batch in self._batches(webids, streamsets, batch_size):
+            yield self._cached("interpolated", batch, params, lambda points, p, failed=None: self._fetch_streams("interpolated", points, p, streamsets),
+                               step=params["interval"], layout=layout)
+
+
+class PIAssetServerClient(_PIWebAPIClient):
+    def __init__(self, base_url, auth: str = "Kerberos", verify: bool =True, username: str =None, password: str =None, asset_server: str = None, asset_database: str = None,
+                 tree_ttl: float = 3600, **kwargs):
+        """ Initialize the PI Asset Server Client.
+        The asset server and database are looked up on first use, not when the client is created.
+        :param base_url: The base URL of the PI Asset Server, or a list of the base URLs of several PI Web API nodes.
+        :param auth: The authentication method to use ("Kerberos" or "Basic").
+        :param verify: Whether to verify SSL certificates (default is True).
+        :param username: The username for basic authentication (required if auth is "Basic").
+        :param password: The password for basic authentication (required if auth is "Basic").
+        :param asset_server: The name of the asset server.
+        :param asset_database: The name of the asset database.
+        :param tree_ttl: Number of seconds a retrieved element hierarchy is reused before it is read again.
+        :param kwargs: Further client options, see PIDataServerClient.
+        """
+        super().__init__(base_url, auth, verify, username, password, **kwargs)
+        self.asset_server = asset_server
+        self.asset_database = asset_database
+        self.tree_ttl = tree_ttl
+        self._trees = {}
+
+    @property
+    def AssetServerID(self) -> str:
+        asset_server_id = self._getAssetServerID(self.asset_server)
+        if not asset_server_id:
+            raise ValueError(f"Asset server '{self.asset_server}' not found.")
+        return asset_server_id
+
+    @property
+    def AssetDBID(self) -> str:
+        asset_db_id = self._getAssetDatabaseID(self.asset_database)
+        if not asset_db_id:
+            raise ValueError(f"Asset database '{self.asset_database}' not found.")
+        return asset_db_id
+
+    def _getAssetServerID(self, data_server_name: str) -> str:
         """
         Get the ID of a data server by its name.
         :param data_server_name: The name of the data server.
         :return: The ID of the data server.
         """
+        cached = self.webid_cache.get(self._scope("/assetservers"), data_server_name)
+        if cached:
+            return cached
 
         url = f"{self.base_url}/assetservers"
-        response = self.session.get(url)
+        response = self._request("GET", url, params=self._lean({}, _SERVER_FIELDS))
         if response.status_code == 200:
-            data_servers = response.json()["Items"]
+            data_servers = self._parse(response)["Items"]
             match = next((server for server in data_servers if server["Name"] == data_server_name), None)
             if match:
                 self.logger.info(f"Data server '{data_server_name}' found with ID: {match['WebId']}")
-                self.AssetServerID = match["WebId"]
+                self.webid_cache.set(self._scope("/assetservers"), data_server_name, match["WebId"])
+                return match["WebId"]
             else:
                 self.logger.error(f"Data server '{data_server_name}' not found.")
         else:
             self.logger.error(f"Failed to get data server ID: {response.status_code} - {response.text}")
         return None
 
-    def _getAssetDatabaseID(self, asset_database_name: str) -> None:
+    def _getAssetDatabaseID(self, asset_database_name: str) -> str:
         """
         Get the ID of an asset database by its name.
         :param asset_database_name: The name of the asset database.
         :return: The ID of the asset database.
         """
+        scope = self._scope(f"/assetdatabases/{self.asset_server}")
+        cached = self.webid_cache.get(scope, asset_database_name)
+        if cached:
+            return cached
+
         url = f"{self.base_url}/assetservers/{self.AssetServerID}/assetdatabases"
-        response = self.session.get(url)
+        response = self._request("GET", url, params=self._lean({}, _SERVER_FIELDS))
         if response.status_code == 200:
-            asset_databases = response.json()["Items"]
+            asset_databases = self._parse(response)["Items"]
             match = next((db for db in asset_databases if db["Name"] == asset_database_name), None)
             if match:
                 self.logger.info(f"Asset database '{asset_database_name}' found with ID: {match['WebId']}")
-                self.AssetDBID = match["WebId"]
+                self.webid_cache.set(scope, asset_database_name, match["WebId"])
+                return match["WebId"]
             else:
                 self.logger.error(f"Asset database '{asset_database_name}' not found.")
         else:
             self.logger.error(f"Failed to get asset database ID: {response.status_code} - {response.text}")
         return None
-    
+
+    def _full_path(self, path: str) -> str:
+        # Paths relative to the asset database are prefixed with the server and database
+        if path.startswith("\\\\"):
+            return path
+        return f"\\\\{self.asset_server}\\{self.asset_database}\\{path.lstrip(chr(92))}"
+
+    @instrumented
     def webids(self, object_list):
         """
         Retrieve webids for the specified tags from the given asset database.
-        :param object_list: A list of elements or attributes to return webids for.
+        :param object_list: A list of elements or attributes to return webids for, as full paths
+            (\\\\server\\database\\element|attribute) or paths relative to the asset database (element\\child|attribute).
         :return: A list of dictionaries containing object names and their corresponding webids.
         """
+        if len(object_list) == 0:
+            self.logger.error(f"No elements or attributes provided")
+            return None
+        paths = {name: self._full_path(name) for name in object_list}
+        resolved = {}
+        for scope, kind in (("/attributes", "attributes"), ("/elements", "elements")):
+            # Attribute paths contain a '|' separating the attribute from its element
+            wanted = [path for path in dict.fromkeys(paths.values()) if ("|" in path) == (kind == "attributes")]
+            cached = self.webid_cache.get_many(self._scope(scope), wanted)
+            missing = [path for path in wanted if path not in cached]
+            self._emit({"type": "cache", "cache": "webid", "hits": len(cached), "misses": len(missing)})
+            if missing:
+                found = self._lookup_paths(kind, missing)
+                self.webid_cache.set_many(self._scope(scope), found)
+                cached.update(found)
+            resolved.update(cached)
+
+        webids = []
+        for name in object_list:
+            if paths[name] in resolved:
+                webids.append(dict({'tag': name, 'webid': resolved[paths[name]]}))
+            else:
+                self.logger.error(f"'{name}' not found in asset database '{self.asset_database}'.")
+        if not webids:
+            self.logger.error(f"No valid elements or attributes found in asset database '{self.asset_database}'.")
+            return None
+        return webids
+
+    def invalidate_webids(self, object_list: list = None) -> None:
+        """
+        Drop cached webids and element hierarchies so they are read again on the next request.
+        :param object_list: A list of elements or attributes to invalidate (everything if None).
+        """
+        if object_list is None:
+            self.webid_cache.invalidate()
+            self._trees.clear()
+            return
+        paths = [self._full_path(name) for name in object_list]
+        self.webid_cache.invalidate(self._scope("/attributes"), [path for path in paths if "|" in path])
+        self.webid_cache.invalidate(self._scope("/elements"), [path for path in paths if "|" not in path])
 
+    @instrumented
+    def elements(self, root: str = None, nameFilter: str = None, templateName: str = None, pageSize: int = 1000) -> pd.DataFrame:
+        """
+        Retrieve the element hierarchy below a root element, cached for tree_ttl seconds.
+        The webids of all elements are cached as well, so later lookups of their paths need no request.
+        :param root: The path of the root element (the whole asset database if None).
+        :param nameFilter: Only return elements whose name matches this filter (e.g. "Pump*").
+        :param templateName: Only return elements based on this template.
+        :param pageSize: The number of elements requested per page.
+        :return: A DataFrame with Path, Name, TemplateName, HasChildren and WebId columns.
+        """
+        key = (root, nameFilter, templateName)
+        cached = self._trees.get(key)
+        if cached and cached[0] > time.time():
+            return cached[1]
 
-class PIDataServerClient:
-    def __init__(self, base_url: str, auth: str = "Kerberos", verify: bool =True, username: str =None, password: str =None):
-        self.base_url = base_url
-        self.username = username
-        self.password = password
-        self.logger = logging.getLogger("PIDataServerClient")
-        logging.basicConfig(level=logging.INFO)
-        self.session = requests.Session()
-        if auth == "Kerberos":
-            self.logger.info("Using Kerberos authentication.")
-            self.session.auth = requests_kerberos.HTTPKerberosAuth(mutual_authentication=requests_kerberos.DISABLED)
-        elif auth == "Basic":
-            if not username or not password:
-                raise ValueError("Username and password must be provided for basic authentication.")
-            self.logger.info("Using Basic authentication.")
-            self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = verify
-        if self.session.verify == False:
-            # Suppress warnings about unverified HTTPS requests
-            warnings.filterwarnings("ignore", message="Unverified HTTPS request")
-        
+        if root is None:
+            url = f"{self.base_url}/assetdatabases/{self.AssetDBID}/elements"
+        else:
+            root_webids = self.webids([root])
+            if not root_webids:
+                return None
+            url = f"{self.base_url}/elements/{root_webids[0]['webid']}/elements"
+        params = {
+            "searchFullHierarchy": "true",
+            "maxCount": pageSize,
+            "selectedFields": "Items.WebId;Items.Name;Items.Path;Items.TemplateName;Items.HasChildren",
+        }
+        params = self._lean(params)
+        if nameFilter:
+            params["nameFilter"] = nameFilter
+        if templateName:
+            params["templateName"] = templateName
+
+        items = []
+        while True:
+            response = self._request("GET", url, params={**params, "startIndex": len(items)})
+            if response.status_code != 200:
+                self.logger.error(f"Failed to get elements below '{root or self.asset_database}': {response.status_code} - {response.text}")
+                return None
+            page = self._parse(response)["Items"]
+            items.extend(page)
+            if len(page) < pageSize:
+                break
+
+        tree = pd.DataFrame(items, columns=["Path", "Name", "TemplateName", "HasChildren", "WebId"])
+        self.webid_cache.set_many(self._scope("/elements"), dict(zip(tree["Path"], tree["WebId"])))
+        self._trees[key] = (time.time() + self.tree_ttl, tree)
+        return tree
+
+    @instrumented
+    def current_values(self, attributes: list, streamsets: bool = None) -> pd.DataFrame:
+        """
+        Retrieve the current value of the given attributes.
+        :param attributes: A list of attribute paths.
+        :param streamsets: Whether to retrieve many attributes per request through streamsets (defaults to the client setting).
+        :return: A DataFrame with one row per attribute.
+        """
+        webids = self.webids(attributes)
+        if not webids:
+            return None
+        return self._frame(self._fetch_streams("value", webids, self._lean({}, "Timestamp;Value"), streamsets))
+
+    @instrumented
+    def compressed_data(self, attributes: list, starttime: str, endtime: str, streamsets: bool = None,
+                        maxCount: int = 1000, points_per_window: int = None):
+        """
+        Retrieve compressed data for the given attributes.
+        :param attributes: A list of attribute paths.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param streamsets: Whether to retrieve many attributes per request through streamsets (defaults to the client setting).
+        :param maxCount: The maximum number of values per request; longer ranges are paged until complete.
+        :param points_per_window: Split the range into windows of roughly this many values per attribute and fetch them concurrently.
+        :return: A DataFrame in the same shape as PIDataServerClient.compressed_data, with attribute paths in the Tag column.
+        """
+        webids = self.webids(attributes)
+        if not webids:
+            return None
+        params = self._recorded_params(starttime, endtime, maxCount)
+        return self._collect(self._iter_compressed(webids, params, streamsets, points_per_window, len(webids)))
+
+    @instrumented
+    def summary_data(self, attributes: list, starttime: str, endtime: str, summaryDuration: str, summaryType: str = "Average", streamsets: bool = None,
+                     layout: str = "long", quality: bool = False, calculationBasis: str = None, timeType: str = None):
+        """
+        Retrieve summary data for the given attributes.
+        :param attributes: A list of attribute paths.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param summaryDuration: The duration of each summary interval (e.g., "1h").
+        :param summaryType: The type of summary to retrieve (e.g., "Average", "Total"), or a list of types that are
+            retrieved together and returned as one column per type.
+        :param streamsets: Whether to retrieve many attributes per request through streamsets (defaults to the client setting).
+        :param layout: "long" for a row per value, or "wide" for a Timestamp-indexed matrix with one column per attribute
+            (per summary type and attribute for several types), NaN for bad values and the dtype of value_dtype
+            (use streamsets to fill it with few requests).
+        :param quality: With layout "wide", also return a uint8 matrix of QUALITY_* bits as a (values, quality) tuple.
+        :param calculationBasis: How the summaries are calculated, "TimeWeighted" (the server default) or "EventWeighted".
+        :param timeType: The timestamps of the summaries, "Auto", "EarliestTime" or "MostRecentTime" (EarliestTime
+            for several types, so the summaries of an interval share a row).
+        :return: A DataFrame in the same shape as PIDataServerClient.summary_data, with attribute paths in the Tag column.
+        """
+        if not summaryType:
+            raise ValueError("Summary type must be provided.")
+        if not summaryDuration:
+            raise ValueError("Summary duration must be provided.")
+        self._check_layout(layout)
+        webids = self.webids(attributes)
+        if not webids:
+            return None
+        params = self._summary_params(starttime, endtime, summaryDuration, summaryType, calculationBasis, timeType)
+        data = self._collect(self._iter_summary(webids, params, streamsets, len(webids), layout))
+        return data[0] if layout == "wide" and not quality else data
 
+    @instrumented
+    def interpolated_data(self, attributes: list, starttime: str, endtime: str, interval: str, streamsets: bool = None,
+                          layout: str = "long", quality: bool = False):
+        """
+        Retrieve interpolated data for the given attributes.
+        :param attributes: A list of attribute paths.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param interval: The interpolation interval (e.g., "5m").
+        :param streamsets: Whether to retrieve many attributes per request through streamsets (defaults to the client setting).
+        :param layout: "long" for a row per value, or "wide" for a Timestamp-indexed matrix with one column per attribute,
+            NaN for bad values and the dtype of value_dtype (use streamsets to fill it with few requests).
+        :param quality: With layout "wide", also return a uint8 matrix of QUALITY_* bits as a (values, quality) tuple.
+        :return: A DataFrame in the same shape as PIDataServerClient.interpolated_data, with attribute paths in the Tag column.
+        """
+        if not interval:
+            raise ValueError("Interval must be provided.")
+        self._check_layout(layout)
+        webids = self.webids(attributes)
+        if not webids:
+            return None
+        params = self._interpolated_params(starttime, endtime, interval)
+        data = self._collect(self._iter_interpolated(webids, params, streamsets, len(webids), layout))
+        return data[0] if layout == "wide" and not quality else data
+
+    @instrumented
+    def plot_data(self, attributes: list, starttime: str, endtime: str, intervals: int = 640, streamsets: bool = None):
+        """
+        Retrieve values for plotting the given attributes, downsampled by the server.
+        :param attributes: A list of attribute paths.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param intervals: The number of intervals the time range is divided into (e.g., the width of the plot in pixels).
+        :param streamsets: Whether to retrieve many attributes per request through streamsets (defaults to the client setting).
+        :return: A DataFrame in the same shape as PIDataServerClient.plot_data, with attribute paths in the Tag column.
+        """
+        params = self._plot_params(starttime, endtime, intervals)
+        if self.store is not None:
+            self.logger.debug("Plot values depend on the time range and are read without the local store.")
+        webids = self.webids(attributes)
+        if not webids:
+            return None
+        return self._frame(self._fetch_streams("plot", webids, params, streamsets))
+
+
+class PIDataServerClient(_PIWebAPIClient):
     def _getDataServerID(self, data_server_name: str) -> str:
         """
         Get the ID of a data server by its name.
         :param data_server_name: The name of the data server.
         :return: The ID of the data server.
         """
+        cached = self.webid_cache.get(self._scope("/dataservers"), data_server_name)
+        if cached:
+            return cached
 
         url = f"{self.base_url}/dataservers"
-        self.logger.info(f"{url}")
-        response = self.session.get(url)
-        self.logger.info(f"URL: {response.url}")
+        self.logger.debug(f"{url}")
+        response = self._request("GET", url, params=self._lean({}, _SERVER_FIELDS))
+        self.logger.debug(f"URL: {response.url}")
         if response.status_code == 200:
-            data_servers = response.json()["Items"]
+            data_servers = self._parse(response)["Items"]
             match = next((server for server in data_servers if server["Name"] == data_server_name), None)
             if match:
                 self.logger.info(f"Data server '{data_server_name}' found with ID: {match['WebId']}")
+                self.webid_cache.set(self._scope("/dataservers"), data_server_name, match["WebId"])
                 return match["WebId"]
             else:
                 self.logger.error(f"Data server '{data_server_name}' not found.")
         else:
             self.logger.error(f"Failed to get data server ID: {response.status_code} - {response.text}")
         return None
-    
-    
+
+    @instrumented
     def webids(self, dataserver: str, taglist: list):
         """
         Retrieve webids for the specified tags from the given data server.
@@ -156,213 +1166,455 @@ class PIDataServerClient:
         if len(taglist) == 0:
             self.logger.error(f"No tags provided")
             return None
-        # Construct the URL for the points endpoint 
-        pointsURL = f"{self.base_url}/dataservers/{data_server_id}/points"
-    
-        # Retrieve webids for the tags
+        # Resolve uncached tags in bulk and serve the rest from the cache
+        resolved = self.webid_cache.get_many(self._scope(dataserver), taglist)
+        missing = [tag for tag in dict.fromkeys(taglist) if tag not in resolved]
+        self._emit({"type": "cache", "cache": "webid", "hits": len(resolved), "misses": len(missing)})
+        if missing:
+            found = self._lookup_points(dataserver, missing)
+            self.webid_cache.set_many(self._scope(dataserver), found)
+            resolved.update(found)
+
         webids = []
         for tag in taglist:
-            url = f"{pointsURL}?namefilter={tag}"
-            response = self.session.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data["Items"]:
-                    webids.append(dict({'tag': tag, 'webid': data["Items"][0]["WebId"]}))
-                else:
-                    self.logger.error(f"Tag '{tag}' not found in data server '{dataserver}'.")
+            if tag in resolved:
+                webids.append(dict({'tag': tag, 'webid': resolved[tag]}))
             else:
-                self.logger.error(f"Failed to get webid for tag '{tag}': {response.status_code} - {response.text}")
-        
+                self.logger.error(f"Tag '{tag}' not found in data server '{dataserver}'.")
+
         if not webids:
             self.logger.error(f"No valid tags found in data server '{dataserver}'.")
             return None
         
         return webids
-    
-    def compressed_data(self, dataserver, taglist: list, starttime: str, endtime: str):
+
+    def _lookup_points(self, dataserver: str, taglist: list) -> dict:
         """
-        Retrieve compressed data from the specified data server for the given tags.
+        Resolve tags to webids with path-based multi-point lookups.
         :param dataserver: The name of the data server.
-        :param taglist: A list of tags to retrieve data for.
-        :param starttime: The start time for the data retrieval.
-        :param endtime: The end time for the data retrieval.
-        :return: A DataFrame containing the retrieved data.
+        :param taglist: A list of tags to resolve.
+        :return: A dictionary of tag name to webid for every tag that was found.
         """
-        # Get the data server ID
-        data_server_id = self._getDataServerID(dataserver)
-        if not data_server_id:
-            self.logger.error(f"Data server '{dataserver}' not found.")
+        paths = {f"\\\\{dataserver}\\{tag}": tag for tag in taglist}
+        found = self._lookup_paths("points", list(paths))
+        return {paths[path]: webid for path, webid in found.items()}
+
+    def invalidate_webids(self, dataserver: str = None, taglist: list = None) -> None:
+        """
+        Drop cached webids so they are looked up again on the next request.
+        :param dataserver: The name of the data server (all data servers if None).
+        :param taglist: A list of tags to invalidate (all tags of the data server if None).
+        """
+        if dataserver is None:
+            self.webid_cache.invalidate()
+            return
+        self.webid_cache.invalidate(self._scope(dataserver), taglist)
+        if taglist is None:
+            self.webid_cache.invalidate(self._scope("/dataservers"), [dataserver])
+
+    @instrumented
+    def plan_windows(self, dataserver, taglist: list, starttime: str, endtime: str, points_per_window: int, streamsets: bool = None) -> list:
+        """
+        Split a time range into windows of roughly the same number of recorded values per tag.
+        The density of each tag is taken from a Count summary over the whole range.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to plan windows for.
+        :param starttime: The start time of the range.
+        :param endtime: The end time of the range.
+        :param points_per_window: The targeted number of recorded values per window.
+        :param streamsets: Whether to retrieve the counts through streamsets (defaults to the client setting).
+        :return: A list of dictionaries with the tag, webid, starttime and endtime of every window.
+        """
+        webids = self.webids(dataserver, taglist)
+        if not webids:
+            self.logger.error(f"No valid tags found in data server '{dataserver}'.")
             return None
+        return self._plan_windows(webids, starttime, endtime, points_per_window, streamsets)
+
+    def _batch_query(self, dataserver, taglist: list, endpoint: str, params: dict, values=None, layout: str = "long",
+                     types: list = None, streamsets: bool = None):
+        """
+        Resolve tags and read their data through the /batch endpoint, so lookups and reads happen server-side.
+        The tags are sent in batches of up to streamset_size tags. Cached webids are read directly, through streamset
+        requests if streamsets is set; the other tags are looked up by path and read through a request template
+        that depends on the lookup, in the same round trip.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param endpoint: The stream endpoint (e.g. "recorded", "summary", "interpolated").
+        :param params: The query parameters of the data requests.
+        :param values: A function extracting the value objects from the items (the items themselves if None).
+        :param layout: "long" or "wide", see _frame.
+        :param types: The summary types of a summary request for several types, see _frame.
+        :param streamsets: Whether to read cached webids through ad hoc streamsets (defaults to the client setting).
+        :return: A DataFrame containing the retrieved data, or None if no tag was found.
+        """
         if len(taglist) == 0:
             self.logger.error(f"No tags provided")
             return None
-        # Construct the URL for the points endpoint 
-        pointsURL = f"{self.base_url}/dataservers/{data_server_id}/points"
-    
-        # Retrieve webids for the tags
-        webids = self.webids(dataserver, taglist)
-        if not webids:
+        if streamsets is None:
+            streamsets = self.use_streamsets
+        tags = list(dict.fromkeys(taglist))
+        resolved = self.webid_cache.get_many(self._scope(dataserver), tags)
+        self._emit({"type": "cache", "cache": "webid", "hits": len(resolved), "misses": len(tags) - len(resolved)})
+        groups = [tags[i:i + self.streamset_size] for i in range(0, len(tags), self.streamset_size)]
+
+        points = []
+        results = []
+        for group_points, group_results in self._map(
+                lambda group: self._batch_group(dataserver, group, resolved, endpoint, params, streamsets), groups):
+            points.extend(group_points)
+            results.extend(group_results)
+
+        if not points:
             self.logger.error(f"No valid tags found in data server '{dataserver}'.")
             return None
-        
-        # Pull data for each tag
-        data = pd.DataFrame()
-        for item in webids:
-            url = f"{self.base_url}/streams/{item['webid']}/recorded"
-            params = {
-                "startTime": starttime,
-                "endTime": endtime,
-                "maxCount": 1000
-                #selectedFields: selectedFields
+        if endpoint == "recorded":
+            # Page tags that hit maxCount from their last timestamp
+            webid_of = {point['tag']: point['webid'] for point in points}
+            truncated = [i for i, (_, items) in enumerate(results) if len(items) >= params["maxCount"]]
+            pages = self._map(lambda i: self._page_recorded(webid_of[results[i][0]], results[i][0], results[i][1], params), truncated)
+            for i, items in zip(truncated, pages):
+                results[i] = (results[i][0], items)
+        # Restore the order of the tag list
+        order = {tag: i for i, tag in enumerate(tags)}
+        results.sort(key=lambda result: order[result[0]])
+        return self._frame(results, values, layout, types)
+
+    def _batch_group(self, dataserver, tags: list, resolved: dict, endpoint: str, params: dict, streamsets: bool):
+        """
+        Send the /batch request of one group of tags, see _batch_query.
+        :param dataserver: The name of the data server.
+        :param tags: The tags of the group.
+        :param resolved: The cached webids of the tags, by tag.
+        :param endpoint: The stream endpoint (e.g. "recorded", "summary", "interpolated").
+        :param params: The query parameters of the data requests.
+        :param streamsets: Whether to read cached webids through ad hoc streamsets.
+        :return: A (points, results) tuple with the webids found and the (tag, items) tuples read.
+        """
+        query = urlencode(params, doseq=True)
+        batch = {}
+        cached = [{'tag': tag, 'webid': resolved[tag]} for tag in tags if tag in resolved]
+        if streamsets:
+            streamset_url = f"{self.base_url}/streamsets/{endpoint}"
+            streamset_query = urlencode(_streamset_params(endpoint, params), doseq=True)
+            budget = self.max_url_length - len(streamset_url) - len(streamset_query) - 2
+            point_of = {point['webid']: point for point in cached}
+            reads = [[point_of[webid] for webid in chunk] for chunk in _chunk_query_values(list(point_of), "webId", budget)]
+            for i, chunk in enumerate(reads):
+                webids = urlencode([("webId", point['webid']) for point in chunk])
+                batch[f"read{i}"] = {"Method": "GET", "Resource": f"{streamset_url}?{streamset_query}&{webids}"}
+        else:
+            reads = [[point] for point in cached]
+            for i, (point,) in enumerate(reads):
+                batch[f"read{i}"] = {"Method": "GET", "Resource": f"{self.base_url}/streams/{point['webid']}/{endpoint}?{query}"}
+
+        missing = [tag for tag in tags if tag not in resolved]
+        paths = [f"\\\\{dataserver}\\{tag}" for tag in missing]
+        path_tags = {path.lower(): tag for path, tag in zip(paths, missing)}
+        lookup_url = f"{self.base_url}/points/multiple"
+        extra = self._lean([], _LOOKUP_FIELDS)
+        chunks = list(_chunk_query_values(paths, "path", self.max_url_length - len(lookup_url) - len(urlencode(extra)) - 2))
+        for j, chunk in enumerate(chunks):
+            batch[f"lookup{j}"] = {"Method": "GET", "Resource": f"{lookup_url}?{urlencode([('path', path) for path in chunk] + extra)}"}
+            batch[f"lookupread{j}"] = {
+                "Method": "GET",
+                "RequestTemplate": {"Resource": f"{self.base_url}/streams/{{0}}/{endpoint}?{query}"},
+                "ParentIds": [f"lookup{j}"],
+                "Parameters": [f"$.lookup{j}.Content.Items[*].Object.WebId"],
             }
-            response = self.session.get(url, params=params)
-            if response.status_code == 409:
-                self.logger.error(f"Conflict error for tag '{item['tag']}': {response.status_code} - {response.text}")
+
+        # The batch only reads, so it is retried like a GET
+        response = self._request("POST", f"{self.base_url}/batch", idempotent=True, json=batch)
+        if response.status_code not in (200, 207):
+            self._log_failure(", ".join(tags), response)
+            return [], []
+        content = self._parse(response)
+
+        points = []
+        results = []
+        # Tags read as separate requests with retries, e.g. after a transient failure inside the batch
+        separate = []
+
+        def add(point, entry):
+            points.append(point)
+            status = entry.get("Status")
+            if status == 200:
+                results.append((point['tag'], (entry.get("Content") or {}).get("Items") or []))
+            elif status in self.retry_policy.statuses:
+                separate.append(point)
+            else:
+                self.logger.error(f"Failed to get data for tag '{point['tag']}': {status} - {entry.get('Content')}")
+
+        for i, chunk in enumerate(reads):
+            entry = content.get(f"read{i}", {})
+            if not streamsets:
+                add(chunk[0], entry)
                 continue
-            if response.status_code == 400:
-                self.logger.error(f"Bad request for tag '{item['tag']}': {response.status_code} - {response.text}")
+            points.extend(chunk)
+            status = entry.get("Status")
+            if status not in (200, 207):
+                if status in self.retry_policy.statuses:
+                    separate.extend(chunk)
+                else:
+                    self.logger.error(f"Failed to get data for tags {', '.join(repr(point['tag']) for point in chunk)}: "
+                                      f"{status} - {entry.get('Content')}")
                 continue
-            if response.status_code == 200:
-                data_response = response.json()
-                if data_response["Items"]:
-                    df = pd.DataFrame(data_response["Items"])
-                    df.insert(loc=0, column ='Tag', value = item['tag'])
-                    df["Value"] = pd.to_numeric(df["Value"], errors='coerce')
-                    df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
-                    data = pd.concat([data, df], ignore_index=True)
+            streams = {stream.get("WebId"): stream for stream in (entry.get("Content") or {}).get("Items", [])}
+            for point in chunk:
+                stream = streams.get(point['webid'])
+                if stream is None:
+                    separate.append(point)
+                elif stream.get("Exception"):
+                    self.logger.error(f"Failed to get data for tag '{point['tag']}': {stream['Exception'].get('Errors')}")
                 else:
-                    self.logger.error(f"No data found for tag '{item['tag']}' in the specified time range.")
-            else:
-                self.logger.error(f"Failed to get data for tag '{item['tag']}': {response.status_code} - {response.text}")
-        return data
-    
+                    results.append((point['tag'], stream.get("Items") or []))
+
+        for j, chunk in enumerate(chunks):
+            lookup = content.get(f"lookup{j}", {})
+            if lookup.get("Status") not in (200, 207):
+                chunk_tags = [path_tags[path.lower()] for path in chunk]
+                self.logger.error(f"Batch lookup failed for tags {', '.join(repr(tag) for tag in chunk_tags)}: "
+                                  f"{lookup.get('Status')} - {lookup.get('Content')}, looking them up separately.")
+                found = self._lookup_points(dataserver, chunk_tags)
+                self.webid_cache.set_many(self._scope(dataserver), found)
+                for tag in chunk_tags:
+                    if tag not in found:
+                        self.logger.error(f"Tag '{tag}' not found in data server '{dataserver}'.")
+                separate.extend({'tag': tag, 'webid': webid} for tag, webid in found.items())
+                points.extend({'tag': tag, 'webid': webid} for tag, webid in found.items())
+                continue
+            found = []
+            for item in (lookup.get("Content") or {}).get("Items", []):
+                tag = path_tags.get(str(item.get("Identifier", "")).lower())
+                if tag is not None and item.get("Object"):
+                    found.append({'tag': tag, 'webid': item["Object"]["WebId"]})
+                elif item.get("Exception"):
+                    self.logger.error(f"Failed to get webid for '{item.get('Identifier')}': {item['Exception'].get('Errors')}")
+            self.webid_cache.set_many(self._scope(dataserver), {point['tag']: point['webid'] for point in found})
+            lookup_reads = (content.get(f"lookupread{j}", {}).get("Content") or {}).get("Items", [])
+            if len(lookup_reads) != len(found):
+                self.logger.error(f"Batch returned {len(lookup_reads)} reads for {len(found)} resolved tags, reading them separately.")
+                separate.extend(found)
+                points.extend(found)
+                continue
+            for point, entry in zip(found, lookup_reads):
+                add(point, entry)
+        if separate:
+            results.extend(self._fetch_streams(endpoint, separate, params, streamsets))
+        return points, results
 
-    def summary_data(self, dataserver, taglist: list, starttime: str, endtime: str, summaryDuration: str, summaryType: str = "Average"):
+    def _resolve(self, dataserver, taglist: list):
         """
-        Retrieve summary data from the specified data server for the given tags.
+        Validate the data server and tags of a retrieval and resolve their webids.
         :param dataserver: The name of the data server.
         :param taglist: A list of tags to retrieve data for.
-        :param starttime: The start time for the data retrieval.
-        :param endtime: The end time for the data retrieval.
-        :param summarytype: The type of summary to retrieve (e.g., "Average", "Total").
-        :return: A DataFrame containing the retrieved summary data.
+        :return: A list of dictionaries containing tag names and their corresponding webids, or None.
         """
-        # Get the data server ID
-        data_server_id = self._getDataServerID(dataserver)
-        if not data_server_id:
-            self.logger.error(f"Data server '{dataserver}' not found.")
-            return None
         if len(taglist) == 0:
             self.logger.error(f"No tags provided")
             return None
-        # Construct the URL for the points endpoint 
-        pointsURL = f"{self.base_url}/dataservers/{data_server_id}/points"
-    
-        # Retrieve webids for the tags
-        webids = self.webids(dataserver, taglist)
-        if not webids:
-            self.logger.error(f"No valid tags found in data server '{dataserver}'.")
-            return None
-        
+        # webids validates the data server and logs missing tags
+        return self.webids(dataserver, taglist)
+
+    def iter_compressed(self, dataserver, taglist: list, starttime: str, endtime: str, streamsets: bool = None,
+                        maxCount: int = 1000, points_per_window: int = None, batch_size: int = None):
+        """
+        Retrieve compressed data batch by batch so it never has to be held in memory at once.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param maxCount: The maximum number of values per request; longer ranges are paged until complete.
+        :param points_per_window: Split the range into windows of roughly this many values per tag, sized from a Count
+            summary, and fetch the windows concurrently.
+        :param batch_size: The number of tags per yielded batch (one streamset chunk or one tag per worker if None).
+        :return: A generator of DataFrames, one per batch of tags.
+        """
+        webids = self._resolve(dataserver, taglist)
+        if webids:
+            params = self._recorded_params(starttime, endtime, maxCount)
+            yield from self._iter_compressed(webids, params, streamsets, points_per_window, batch_size)
+
+    def iter_summary(self, dataserver, taglist: list, starttime: str, endtime: str, summaryDuration: str, summaryType: str = "Average",
+                     streamsets: bool = None, batch_size: int = None, calculationBasis: str = None, timeType: str = None):
+        """
+        Retrieve summary data batch by batch so it never has to be held in memory at once.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param summaryDuration: The duration of each summary interval (e.g., "1h").
+        :param summaryType: The type of summary to retrieve (e.g., "Average", "Total"), or a list of types that are
+            retrieved together and returned as one column per type.
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param batch_size: The number of tags per yielded batch (one streamset chunk or one tag per worker if None).
+        :param calculationBasis: How the summaries are calculated, "TimeWeighted" (the server default) or "EventWeighted".
+        :param timeType: The timestamps of the summaries, "Auto", "EarliestTime" or "MostRecentTime" (EarliestTime
+            for several types, so the summaries of an interval share a row).
+        :return: A generator of DataFrames, one per batch of tags.
+        """
         if not summaryType:
             raise ValueError("Summary type must be provided.")
         if not summaryDuration:
             raise ValueError("Summary duration must be provided.")
+        webids = self._resolve(dataserver, taglist)
+        if webids:
+            params = self._summary_params(starttime, endtime, summaryDuration, summaryType, calculationBasis, timeType)
+            yield from self._iter_summary(webids, params, streamsets, batch_size)
 
-        data = pd.DataFrame()
-        for point in webids:
-            url = f"{self.base_url}/streams/{point['webid']}/summary"
-            #self.logger.info(f"Fetching summary data for tag '{point['tag']}' from {url}")
-            params = {
-                "startTime": starttime,
-                "endTime": endtime,
-                "summaryDuration": summaryDuration,
-                "summaryType": summaryType,
-                'selectedFields': "Items.Value.Timestamp;Items.Value.Value"                        
-            }
-            response = self.session.get(url, params=params)
-            #self.logger.info(f"Fetching data at {response.url}")
-            if response.status_code == 409:
-                self.logger.error(f"Conflict error for tag '{point['tag']}': {response.status_code} - {response.text}")
-                continue
-            if response.status_code == 400:
-                self.logger.error(f"Bad request for tag '{point['tag']}': {response.status_code} - {response.text}")
-                continue
-            if response.status_code == 200:
-                data_response = response.json()
-                if data_response["Items"]:
-                    data_temp = [item["Value"] for item in data_response["Items"]]
-                    df = pd.DataFrame(data_temp)
-                    df.insert(loc=0, column ='Tag', value = point['tag'])
-                    df["Value"] = pd.to_numeric(df["Value"], errors='coerce')
-                    df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
-                    data = pd.concat([data, df], ignore_index=True)
-                else:
-                    self.logger.error(f"No data found for tag '{point['tag']}' in the specified time range.")
-            else:
-                self.logger.error(f"Failed to get data for tag '{point['tag']}': {response.status_code} - {response.text}")
-        return data
-    
-    def interpolated_data(self, dataserver, taglist: list, starttime: str, endtime: str, interval: str):
+    def iter_interpolated(self, dataserver, taglist: list, starttime: str, endtime: str, interval: str,
+                          streamsets: bool = None, batch_size: int = None):
+        """
+        Retrieve interpolated data batch by batch so it never has to be held in memory at once.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param interval: The interpolation interval (e.g., "5m").
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param batch_size: The number of tags per yielded batch (one streamset chunk or one tag per worker if None).
+        :return: A generator of DataFrames, one per batch of tags.
+        """
+        if not interval:
+            raise ValueError("Interval must be provided.")
+        webids = self._resolve(dataserver, taglist)
+        if webids:
+            params = self._interpolated_params(starttime, endtime, interval)
+            yield from self._iter_interpolated(webids, params, streamsets, batch_size)
+
+    @instrumented
+    def compressed_data(self, dataserver, taglist: list, starttime: str, endtime: str, streamsets: bool = None,
+                        maxCount: int = 1000, points_per_window: int = None):
+        """
+        Retrieve compressed data from the specified data server for the given tags.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param maxCount: The maximum number of values per request; longer ranges are paged until complete.
+        :param points_per_window: Split the range into windows of roughly this many values per tag, sized from a Count
+            summary, and fetch the windows concurrently.
+        :return: A DataFrame containing the retrieved data.
+        """
+        params = self._recorded_params(starttime, endtime, maxCount)
+        if self.use_batch and self.store is None and not points_per_window:
+            return self._batch_query(dataserver, taglist, "recorded", params, streamsets=streamsets)
+        webids = self._resolve(dataserver, taglist)
+        if not webids:
+            return None
+        return self._collect(self._iter_compressed(webids, params, streamsets, points_per_window, len(webids)))
+
+    @instrumented
+    def summary_data(self, dataserver, taglist: list, starttime: str, endtime: str, summaryDuration: str, summaryType: str = "Average", streamsets: bool = None,
+                     layout: str = "long", quality: bool = False, calculationBasis: str = None, timeType: str = None):
         """
         Retrieve summary data from the specified data server for the given tags.
         :param dataserver: The name of the data server.
         :param taglist: A list of tags to retrieve data for.
         :param starttime: The start time for the data retrieval.
         :param endtime: The end time for the data retrieval.
-        :param summarytype: The type of summary to retrieve (e.g., "Average", "Total").
+        :param summaryDuration: The duration of each summary interval (e.g., "1h").
+        :param summaryType: The type of summary to retrieve (e.g., "Average", "Total"), or a list of types that are
+            retrieved together and returned as one column per type.
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param layout: "long" for a row per value, or "wide" for a Timestamp-indexed matrix with one column per tag
+            (per summary type and tag for several types), NaN for bad values and the dtype of value_dtype
+            (use streamsets to fill it with few requests).
+        :param quality: With layout "wide", also return a uint8 matrix of QUALITY_* bits as a (values, quality) tuple.
+        :param calculationBasis: How the summaries are calculated, "TimeWeighted" (the server default) or "EventWeighted".
+        :param timeType: The timestamps of the summaries, "Auto", "EarliestTime" or "MostRecentTime" (EarliestTime
+            for several types, so the summaries of an interval share a row).
         :return: A DataFrame containing the retrieved summary data.
         """
-        # Get the data server ID
-        data_server_id = self._getDataServerID(dataserver)
-        if not data_server_id:
-            self.logger.error(f"Data server '{dataserver}' not found.")
-            return None
-        if len(taglist) == 0:
-            self.logger.error(f"No tags provided")
+        if not summaryType:
+            raise ValueError("Summary type must be provided.")
+        if not summaryDuration:
+            raise ValueError("Summary duration must be provided.")
+        self._check_layout(layout)
+        params = self._summary_params(starttime, endtime, summaryDuration, summaryType, calculationBasis, timeType)
+        if self.use_batch and self.store is None:
+            types = None if isinstance(summaryType, str) else params["summaryType"]
+            data = self._batch_query(dataserver, taglist, "summary", params, lambda items: [item["Value"] for item in items], layout, types,
+                                     streamsets)
+        else:
+            webids = self._resolve(dataserver, taglist)
+            if not webids:
+                return None
+            data = self._collect(self._iter_summary(webids, params, streamsets, len(webids), layout))
+        return data[0] if layout == "wide" and data is not None and not quality else data
+
+    @instrumented
+    def interpolated_data(self, dataserver, taglist: list, starttime: str, endtime: str, interval: str, streamsets: bool = None,
+                          layout: str = "long", quality: bool = False):
+        """
+        Retrieve interpolated data from the specified data server for the given tags.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param interval: The interpolation interval (e.g., "5m").
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :param layout: "long" for a row per value, or "wide" for a Timestamp-indexed matrix with one column per tag,
+            NaN for bad values and the dtype of value_dtype (use streamsets to fill it with few requests).
+        :param quality: With layout "wide", also return a uint8 matrix of QUALITY_* bits as a (values, quality) tuple.
+        :return: A DataFrame containing the retrieved interpolated data.
+        """
+        if not interval:
+            raise ValueError("Interval must be provided.")
+        self._check_layout(layout)
+        params = self._interpolated_params(starttime, endtime, interval)
+        if self.use_batch and self.store is None:
+            data = self._batch_query(dataserver, taglist, "interpolated", params, layout=layout, streamsets=streamsets)
+        else:
+            webids = self._resolve(dataserver, taglist)
+            if not webids:
+                return None
+            data = self._collect(self._iter_interpolated(webids, params, streamsets, len(webids), layout))
+        return data[0] if layout == "wide" and data is not None and not quality else data
+
+    @instrumented
+    def plot_data(self, dataserver, taglist: list, starttime: str, endtime: str, intervals: int = 640, streamsets: bool = None):
+        """
+        Retrieve values for plotting the given tags, downsampled by the server.
+        For every interval the server returns the first, last, minimum and maximum value and any value with bad
+        quality, so the shape of dense compressed data is kept with a few values per interval. Plot values depend
+        on the time range and are not kept in the local store.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to retrieve data for.
+        :param starttime: The start time for the data retrieval.
+        :param endtime: The end time for the data retrieval.
+        :param intervals: The number of intervals the time range is divided into (e.g., the width of the plot in pixels).
+        :param streamsets: Whether to retrieve many tags per request through streamsets (defaults to the client setting).
+        :return: A DataFrame containing the retrieved plot data.
+        """
+        params = self._plot_params(starttime, endtime, intervals)
+        if self.store is not None:
+            self.logger.debug("Plot values depend on the time range and are read without the local store.")
+        if self.use_batch:
+            return self._batch_query(dataserver, taglist, "plot", params, streamsets=streamsets)
+        webids = self._resolve(dataserver, taglist)
+        if not webids:
             return None
-        # Construct the URL for the points endpoint 
-        pointsURL = f"{self.base_url}/dataservers/{data_server_id}/points"
-    
-        # Retrieve webids for the tags
-        webids = self.webids(dataserver, taglist)
+        return self._frame(self._fetch_streams("plot", webids, params, streamsets))
+
+    def subscribe(self, dataserver, taglist: list, marker_path: str = None):
+        """
+        Subscribe to the updates of the given tags, so each poll returns only new events.
+        :param dataserver: The name of the data server.
+        :param taglist: A list of tags to subscribe to.
+        :param marker_path: Path of a JSON file the update markers are saved to, so a restart resumes where it left off.
+        :return: A StreamSubscription with poll, listen and run methods, or None if no tag was found.
+        """
+        # Imported here because the subscription module builds on this one
+        from .updates import StreamSubscription
+
+        webids = self._resolve(dataserver, taglist)
         if not webids:
-            self.logger.error(f"No valid tags found in data server '{dataserver}'.")
             return None
-        
-        if not interval:
-            raise ValueError("Interval must be provided.")
+        return StreamSubscription(self, webids, marker_path)
 
-        data = pd.DataFrame()
-        for item in webids:
-            url = f"{self.base_url}/streams/{item['webid']}/interpolated"
-            self.logger.info(f"Fetching interpolated data for tag '{item['tag']}' from {url}")
-            params = {
-                "startTime": starttime,
-                "endTime": endtime,
-                "interval": interval
-            }
-            response = self.session.get(url, params=params)
-            if response.status_code == 409:
-                self.logger.error(f"Conflict error for tag '{item['tag']}': {response.status_code} - {response.text}")
-                continue
-            if response.status_code == 400:
-                self.logger.error(f"Bad request for tag '{item['tag']}': {response.status_code} - {response.text}")
-                continue
-            if response.status_code == 200:
-                data_response = response.json()
-                if data_response["Items"]:
-                    df = pd.DataFrame(data_response["Items"])
-                    df.insert(loc=0, column ='Tag', value = item['tag'])
-                    df["Value"] = pd.to_numeric(df["Value"], errors='coerce')
-                    df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
-                    data = pd.concat([data, df], ignore_index=True)
-                else:
-                    self.logger.error(f"No data found for tag '{item['tag']}' in the specified time range.")
-            else:
-                self.logger.error(f"Failed to get data for tag '{item['tag']}': {response.status_code} - {response.text}")
-        return data
-    
     def send_recorded_value(self, webid: str, data: dict):
         """
         Send a single recorded value to a PI Point.
@@ -382,19 +1634,118 @@ class PIDataServerClient:
             raise ValueError("Data must contain a 'Value' key.")
         if "Timestamp" not in data:
             raise ValueError("Data must contain a 'Timestamp' key.")
-        
-        data = data
 
         try:
-            response = requests.post(
-                url,
-                auth=self.kerberos_auth,
-                data=json.dumps(data),
-                headers=self.headers,
-                verify=True,
-            )
+            # The recorded endpoint takes a list of values
+            response = self._request("POST", url, json=[data])
             response.raise_for_status()
             self.logger.info("Recorded value sent successfully.")
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to send recorded value: {e}")
-       
\ No newline at end of file
+
+    @instrumented
+    def write_recorded(self, data, dataserver: str = None, updateOption: str = "Replace", bufferOption: str = "BufferIfPossible",
+                       batch_size: int = 5000, streamsets: bool = None) -> pd.DataFrame:
+        """
+        Write many recorded values to one or more PI Points.
+        :param data: A DataFrame with Tag (or WebId), Timestamp and Value columns, or an iterable of
+            (tag or webid, timestamp, value) tuples.
+        :param dataserver: The name of the data server, required when values are given by tag.
+        :param updateOption: How to treat existing values ("Replace", "Insert", "NoReplace", "ReplaceOnly", "InsertNoCompression", "Remove").
+        :param bufferOption: Whether to write through the PI Buffer Subsystem ("BufferIfPossible", "Buffer", "DoNotBuffer").
+        :param batch_size: The maximum number of values per request.
+        :param streamsets: Whether to write values of many points per request through streamsets (defaults to the client setting).
+        :return: A DataFrame of the values that could not be written, with the error reported for each of them.
+        """
+        if streamsets is None:
+            streamsets = self.use_streamsets
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(list(data), columns=["Tag" if dataserver else "WebId", "Timestamp", "Value"])
+        data = data.reset_index(drop=True)
+        if "WebId" not in data:
+            if "Tag" not in data:
+                raise ValueError("Data must contain a 'Tag' or 'WebId' column.")
+            if not dataserver:
+                raise ValueError("Data server must be provided when values are given by tag.")
+            webids = self.webids(dataserver, list(dict.fromkeys(data["Tag"])))
+            lookup = {item['tag']: item['webid'] for item in webids or []}
+            data = data.assign(WebId=data["Tag"].map(lookup))
+            unresolved = data[data["WebId"].isna()]
+            data = data[data["WebId"].notna()]
+        else:
+            unresolved = data.iloc[0:0]
+        if "Tag" not in data:
+            data = data.assign(Tag=data["WebId"])
+        if "Timestamp" not in data or "Value" not in data:
+            raise ValueError("Data must contain 'Timestamp' and 'Value' columns.")
+
+        timestamps = pd.to_datetime(data["Timestamp"], utc=True).dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        values = data["Value"].astype(object).where(data["Value"].notna(), None)
+        streams = []
+        for webid, index in data.groupby("WebId", sort=False).groups.items():
+            items = [{"Timestamp": ts, "Value": value} for ts, value in zip(timestamps.loc[index].tolist(), values.loc[index].tolist())]
+            streams.append((webid, index, items))
+
+        # Split into requests of at most batch_size values, one stream each or several streams per streamset request
+        batches = []
+        if streamsets:
+            batch, count = [], 0
+            for webid, index, items in streams:
+                for i in range(0, len(items), batch_size):
+                    part = items[i:i + batch_size]
+                    if batch and count + len(part) > batch_size:
+                        batches.append(batch)
+                        batch, count = [], 0
+                    batch.append((webid, index[i:i + batch_size], part))
+                    count += len(part)
+            if batch:
+                batches.append(batch)
+        else:
+            for webid, index, items in streams:
+                for i in range(0, len(items), batch_size):
+                    batches.append([(webid, index[i:i + batch_size], items[i:i + batch_size])])
+
+        params = {"updateOption": updateOption, "bufferOption": bufferOption}
+
+        def post(batch):
+            if streamsets:
+                url = f"{self.base_url}/streamsets/recorded"
+                body = [{"WebId": webid, "Items": items} for webid, _, items in batch]
+            else:
+                url = f"{self.base_url}/streams/{batch[0][0]}/recorded"
+                body = batch[0][2]
+            try:
+                response = self._request("POST", url, params=params, json=body)
+            except requests.exceptions.RequestException as e:
+                return [(index, str(e)) for _, index, _ in batch]
+            if response.status_code in (202, 204):
+                return []
+            try:
+                content = self._parse(response) if response.content else {}
+            except ValueError:
+                content = {}
+            if streamsets and response.status_code == 207 and isinstance(content.get("Items"), list):
+                # Multi-Status reports the outcome of every stream in request order
+                failed = []
+                for (_, index, _), item in zip(batch, content["Items"]):
+                    if item.get("Substatus", 202) not in (202, 204):
+                        errors = (item.get("Content") or {}).get("Errors") or item.get("Message")
+                        failed.append((index, f"{item.get('Substatus')} - {errors}"))
+                return failed
+            errors = content.get("Errors") if isinstance(content, dict) else None
+            return [(index, f"{response.status_code} - {errors or response.text}") for _, index, _ in batch]
+
+        errors = []
+        for failed in self._map(post, batches):
+            for index, error in failed:
+                errors.append(data.loc[index, ["Tag", "WebId", "Timestamp", "Value"]].assign(Error=error))
+        if len(unresolved):
+            errors.append(unresolved.assign(Error="Tag not found"))
+        if not errors:
+            self.logger.info(f"{len(data)} recorded values sent successfully.")
+            return pd.DataFrame(columns=["Tag", "WebId", "Timestamp", "Value", "Error"])
+        errors = pd.concat(errors, ignore_index=True)
+        self.logger.error(f"Failed to send {len(errors)} of {len(data) + len(unresolved)} recorded values.")
+        return errors
@@ -0,0 +1,227 @@
+import json
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content: bytes):
+    """
+    Parse a JSON response body, with orjson when it is installed.
+    :param content: The raw response body.
+    :return: The parsed JSON document.
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def string_categorical(values) -> pd.Categorical:
+    """
+    Build a categorical column of strings whose categories have the same dtype even when every value is missing,
+    so decoded and stored frames of the same retrieval match.
+    :param values: The strings, None for missing values.
+    :return: The categorical.
+    """
+    values = list(values)
+    return pd.Categorical(values, categories=pd.Index(sorted({value for value in values if value is not None}), dtype=str))
+
+
+def _fill_values(target: np.ndarray, states: np.ndarray, offset: int, values: list) -> None:
+    try:
+        # Fast path: every value is numeric (or None)
+        target[offset:offset + len(values)] = np.asarray(values, dtype=target.dtype)
+        return
+    except (TypeError, ValueError):
+        pass
+    for i, value in enumerate(values, start=offset):
+        if isinstance(value, dict):
+            # Digital states and system states such as "No Data" or "Bad Input"
+            target[i] = np.nan
+            states[i] = value.get("Name")
+        elif isinstance(value, (int, float)):
+            target[i] = value
+        else:
+            target[i] = np.nan
+
+
+def decode_streams(results: list, value_dtype: str = "float64", values=None) -> pd.DataFrame:
+    """
+    Decode the values of several streams into a single DataFrame.
+    Columns are filled into preallocated arrays and converted once, instead of building a frame per tag.
+    :param results: A list of (tag, items) tuples.
+    :param value_dtype: The dtype of the Value column ("float64" or "float32").
+    :param values: A function extracting the value objects from the items (the items themselves if None).
+    :return: A DataFrame with a categorical Tag column, a UTC Timestamp column, a numeric Value column,
+        a categorical DigitalState column (empty unless digital states are present), and the remaining fields
+        (e.g. Good, Questionable, UnitsAbbreviation) as boolean or categorical columns.
+    """
+    results = [(tag, values(items) if values else items) for tag, items in results if items]
+    total = sum(len(items) for _, items in results)
+    if total == 0:
+        return pd.DataFrame()
+
+    codes = np.empty(total, dtype=np.int32)
+    timestamps = np.empty(total, dtype=object)
+    numbers = np.empty(total, dtype=value_dtype)
+    states = np.full(total, None, dtype=object)
+    extra = {}
+    tags = {}
+    offset = 0
+    for tag, items in results:
+        n = len(items)
+        codes[offset:offset + n] = tags.setdefault(tag, len(tags))
+        timestamps[offset:offset + n] = [item["Timestamp"] for item in items]
+        _fill_values(numbers, states, offset, [item.get("Value") for item in items])
+        for key in items[0]:
+            if key in ("Timestamp", "Value") or key in extra:
+                continue
+            extra[key] = np.full(total, None, dtype=object)
+        for key, column in extra.items():
+            column[offset:offset + n] = [item.get(key) for item in items]
+        offset += n
+
+    data = {
+        "Tag": pd.Categorical.from_codes(codes, categories=list(tags)),
+        # The parsed unit depends on the fractional digits present, so frames are kept in nanoseconds like the store
+        "Timestamp": pd.to_datetime(timestamps, utc=True, format="ISO8601").as_unit("ns"),
+        "Value": numbers,
+    }
+    # Always present, so batches of the same retrieval share their columns
+    data["DigitalState"] = string_categorical(states)
+    for key, column in extra.items():
+        present = [value for value in column if value is not None]
+        if present and all(isinstance(value, bool) for value in present):
+            data[key] = np.array([bool(value) for value in column], dtype=bool)
+        elif present and all(isinstance(value, str) for value in present):
+            data[key] = string_categorical(column)
+        else:
+            data[key] = column
+    return pd.DataFrame(data)
+
+
+# Bits of the quality mask returned with wide frames
+QUALITY_BAD = 1
+QUALITY_QUESTIONABLE = 2
+QUALITY_SUBSTITUTED = 4
+QUALITY_ANNOTATED = 8
+QUALITY_MISSING = 16
+
+_QUALITY_FIELDS = (("Questionable", QUALITY_QUESTIONABLE), ("Substituted", QUALITY_SUBSTITUTED), ("Annotated", QUALITY_ANNOTATED))
+
+
+def _assemble(tags: list, columns: np.ndarray, timestamps: pd.DatetimeIndex, numbers: np.ndarray, flags: np.ndarray, value_dtype: str):
+    # Every distinct timestamp becomes a row, so streams on the same grid line up without reindexing
+    stamps, rows = np.unique(timestamps.as_unit("ns").asi8, return_inverse=True)
+    index = pd.DatetimeIndex(pd.to_datetime(stamps, unit="ns", utc=True), name="Timestamp")
+    header = pd.Index(tags, name="Tag")
+    matrix = np.full((len(stamps), len(tags)), np.nan, dtype=value_dtype)
+    quality = np.full((len(stamps), len(tags)), QUALITY_MISSING, dtype=np.uint8)
+    matrix[rows, columns] = numbers
+    quality[rows, columns] = flags
+    return pd.DataFrame(matrix, index=index, columns=header), pd.DataFrame(quality, index=index, columns=header)
+
+
+def decode_wide(results: list, value_dtype: str = "float64", values=None):
+    """
+    Decode the values of several streams into a timestamp-indexed matrix with one column per tag.
+    Bad values (digital or system states, Good set to false) are NaN and flagged in the quality mask.
+    :param results: A list of (tag, items) tuples.
+    :param value_dtype: The dtype of the values ("float64" or "float32").
+    :param values: A function extracting the value objects from the items (the items themselves if None).
+    :return: A (values, quality) tuple of DataFrames sharing a UTC Timestamp index and Tag columns; quality holds
+        a uint8 bitmask of QUALITY_BAD, QUALITY_QUESTIONABLE, QUALITY_SUBSTITUTED, QUALITY_ANNOTATED and QUALITY_MISSING.
+    """
+    results = [(tag, values(items) if values and items else items or []) for tag, items in results]
+    tags = list(dict.fromkeys(tag for tag, _ in results))
+    position = {tag: i for i, tag in enumerate(tags)}
+    counts = [len(items) for _, items in results]
+    total = sum(counts)
+
+    columns = np.repeat(np.array([position[tag] for tag, _ in results], dtype=np.intp), counts)
+    timestamps = np.empty(total, dtype=object)
+    numbers = np.empty(total, dtype=value_dtype)
+    states = np.full(total, None, dtype=object)
+    flags = np.zeros(total, dtype=np.uint8)
+    offset = 0
+    for _, items in results:
+        n = len(items)
+        if n == 0:
+            continue
+        timestamps[offset:offset + n] = [item["Timestamp"] for item in items]
+        _fill_values(numbers, states, offset, [item.get("Value") for item in items])
+        if "Good" in items[0]:
+            flags[offset:offset + n] |= np.array([item.get("Good") is False for item in items]) * np.uint8(QUALITY_BAD)
+        for key, bit in _QUALITY_FIELDS:
+            if key in items[0]:
+                flags[offset:offset + n] |= np.array([bool(item.get(key)) for item in items]) * np.uint8(bit)
+        offset += n
+
+    bad = (states != None) | np.isnan(numbers) | (flags & QUALITY_BAD).astype(bool)
+    numbers[bad] = np.nan
+    flags[bad] |= QUALITY_BAD
+    return _assemble(tags, columns, pd.to_datetime(timestamps, utc=True, format="ISO8601"), numbers, flags, value_dtype)
+
+
+def widen(df: pd.DataFrame, value_dtype: str = "float64"):
+    """
+    Convert a long frame as returned by decode_streams into the wide layout of decode_wide.
+    :param df: The long DataFrame.
+    :param value_dtype: The dtype of the values ("float64" or "float32").
+    :return: A (values, quality) tuple of DataFrames, see decode_wide.
+    """
+    if df.empty:
+        return decode_wide([], value_dtype)
+    tags = pd.Categorical(df["Tag"])
+    numbers = df["Value"].to_numpy(dtype=value_dtype, na_value=np.nan, copy=True)
+    flags = np.zeros(len(df), dtype=np.uint8)
+    if "Good" in df:
+        flags |= (~df["Good"].to_numpy(dtype=bool)) * np.uint8(QUALITY_BAD)
+    for key, bit in _QUALITY_FIELDS:
+        if key in df:
+            flags |= df[key].to_numpy(dtype=bool) * np.uint8(bit)
+    bad = np.isnan(numbers) | (flags & QUALITY_BAD).astype(bool)
+    if "DigitalState" in df:
+        bad |= df["DigitalState"].notna().to_numpy()
+    numbers[bad] = np.nan
+    flags[bad] |= QUALITY_BAD
+    return _assemble(list(tags.categories), tags.codes.astype(np.intp), pd.DatetimeIndex(df["Timestamp"]), numbers, flags, value_dtype)
+
+
+def summary_columns(df: pd.DataFrame, types: list, value_dtype: str = "float64", layout: str = "long"):
+    """
+    Turn a long frame of several summary types, with a Type column, into one column per summary type.
+    :param df: The long DataFrame as returned by decode_streams, with a Type column.
+    :param types: The summary types, in the order of their columns.
+    :param value_dtype: The dtype of the values ("float64" or "float32").
+    :param layout: "long" for Tag and Timestamp columns followed by a column per type, or "wide" for a (values, quality)
+        tuple as returned by decode_wide whose columns are a (Type, Tag) MultiIndex.
+    :return: The DataFrame, or the tuple of the wide layout.
+    """
+    if layout == "wide":
+        parts = [widen(df[df["Type"] == kind] if not df.empty else df, value_dtype) for kind in types]
+        return tuple(pd.concat(frames, axis=1, keys=types, names=["Type"]) for frames in zip(*parts))
+    if df.empty:
+        return df
+    # Summaries of the same interval share a timestamp unless timeType moves them to their events
+    keys = ["Tag", "Timestamp"]
+    data = df.drop_duplicates(keys + ["Type"]).set_index(keys + ["Type"])["Value"].unstack("Type")
+    data = data.reindex(columns=types).reset_index()
+    data.columns.name = None
+    return data
+
+
+def decode_summaries(results: list, types: list, value_dtype: str = "float64", layout: str = "long"):
+    """
+    Decode the items of a summary request for several summary types.
+    :param results: A list of (tag, items) tuples, the items carrying their Type.
+    :param types: The requested summary types.
+    :param value_dtype: The dtype of the values ("float64" or "float32").
+    :param layout: "long" or "wide", see summary_columns.
+    :return: The DataFrame, or the tuple of the wide layout.
+    """
+    df = decode_streams(results, value_dtype, lambda items: [{**item["Value"], "Type": item.get("Type")} for item in items])
+    return summary_columns(df, types, value_dtype, layout)
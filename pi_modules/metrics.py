@@ -0,0 +1,226 @@
+import contextvars
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+import pandas as pd
+
+# The metrics of the public client call running in the current context
+_current = contextvars.ContextVar("pi_call_metrics", default=None)
+
+# Collections whose next path segment is the webid or name of a single object
+_COLLECTIONS = {"streams", "points", "elements", "attributes", "dataservers", "assetservers", "assetdatabases"}
+
+
+def endpoint_of(url: str, base_url: str) -> str:
+    """
+    Get a low-cardinality endpoint label of a request URL, with webids replaced by a placeholder.
+    :param url: The request URL.
+    :param base_url: The base URL of the PI Web API.
+    :return: The endpoint, e.g. "/streams/{webId}/recorded".
+    """
+    path = url[len(base_url):] if url.startswith(base_url) else re.sub(r"^\w+://[^/]+", "", url)
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] in _COLLECTIONS and segments[i] != "multiple":
+            segments[i] = "{webId}"
+    return "/" + "/".join(segments)
+
+
+class CallMetrics:
+    """Summary of the requests, retries, cache lookups and decoding of one public client call."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, name: str):
+        """ Initialize the summary of a client call.
+        :param name: The name of the client method.
+        """
+        self.name = name
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.request_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rows = 0
+        self.wall_seconds = 0.0
+        self.statuses = {}
+
+    def record(self, event: dict) -> None:
+        """
+        Add an instrumentation event to the summary.
+        :param event: The event (see MetricsCollector).
+        """
+        kind = event["type"]
+        with self._lock:
+            if kind == "request":
+                self.requests += 1
+                self.bytes_in += event["bytes_in"]
+                self.bytes_out += event["bytes_out"]
+                self.request_seconds += event["seconds"]
+                self.statuses[event["status"]] = self.statuses.get(event["status"], 0) + 1
+                if not isinstance(event["status"], int) or event["status"] >= 400:
+                    self.errors += 1
+            elif kind == "retry":
+                self.retries += 1
+            elif kind == "cache":
+                self.cache_hits += event["hits"]
+                self.cache_misses += event["misses"]
+            elif kind == "parse":
+                self.parse_seconds += event["seconds"]
+            elif kind == "decode":
+                self.decode_seconds += event["seconds"]
+                self.rows += event["rows"]
+
+    def as_dict(self) -> dict:
+        """
+        Get the summary as a dictionary.
+        """
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        return (f"CallMetrics({self.name}: {self.wall_seconds:.3f}s wall, {self.requests} requests "
+                f"({self.request_seconds:.3f}s, {self.retries} retries, {self.errors} errors), "
+                f"{self.bytes_in} bytes in, {self.bytes_out} bytes out, parse {self.parse_seconds:.3f}s, "
+                f"decode {self.decode_seconds:.3f}s, {self.rows} rows, cache {self.cache_hits} hits / {self.cache_misses} misses)")
+
+
+def instrumented(method):
+    """
+    Measure a public client method as one call.
+    The summary is kept as client.last_metrics and, for DataFrame results, in result.attrs["metrics"].
+    Calls made from inside another measured call are counted towards the outer call.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is not None:
+            return method(self, *args, **kwargs)
+        call = CallMetrics(method.__name__)
+        token = _current.set(call)
+        started = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            call.wall_seconds = time.perf_counter() - started
+            _current.reset(token)
+            self.last_metrics = call
+        # Wide results with quality are (values, quality) tuples
+        frame = result[0] if isinstance(result, tuple) and result else result
+        if isinstance(frame, pd.DataFrame):
+            frame.attrs["metrics"] = call
+        return result
+
+    return wrapper
+
+
+def current_call() -> CallMetrics:
+    """
+    Get the metrics of the client call running in the current context, if any.
+    """
+    return _current.get()
+
+
+class MetricsCollector:
+    """Aggregate instrumentation events into counters and histograms that can be exported in the OpenMetrics text format.
+
+    Register it on a client with client.add_hook(collector). Events are dictionaries with a "type" key:
+
+    - request: method, endpoint, host, status (code, or exception name), seconds, bytes_in, bytes_out, attempt
+    - retry: method, endpoint, host, reason, delay
+    - cache: cache ("webid" or "store"), hits, misses
+    - parse: endpoint, seconds, bytes
+    - decode: source ("response" or "store"), seconds, rows
+    """
+
+    def __init__(self, buckets: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+                 prefix: str = "piwebapi"):
+        """ Initialize the collector.
+        :param buckets: The upper bounds in seconds of the duration histogram buckets.
+        :param prefix: The prefix of all metric names.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear all counters and histograms.
+        """
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def _count(self, name: str, labels: tuple, value: float = 1) -> None:
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def _observe(self, name: str, labels: tuple, value: float) -> None:
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][bisect_left(self.buckets, value)] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def __call__(self, event: dict) -> None:
+        kind = event["type"]
+        with self._lock:
+            if kind == "request":
+                labels = (("method", event["method"]), ("endpoint", event["endpoint"]))
+                self._count("requests", labels + (("host", event.get("host", "")), ("status", str(event["status"]))))
+                self._count("received_bytes", labels, event["bytes_in"])
+                self._count("sent_bytes", labels, event["bytes_out"])
+                self._observe("request_duration_seconds", labels, event["seconds"])
+            elif kind == "retry":
+                self._count("retries", (("method", event["method"]), ("endpoint", event["endpoint"]), ("reason", str(event["reason"]))))
+            elif kind == "cache":
+                self._count("cache_hits", (("cache", event["cache"]),), event["hits"])
+                self._count("cache_misses", (("cache", event["cache"]),), event["misses"])
+            elif kind == "parse":
+                self._observe("parse_duration_seconds", (("endpoint", event["endpoint"]),), event["seconds"])
+            elif kind == "decode":
+                self._count("decoded_rows", (("source", event["source"]),), event["rows"])
+                self._observe("decode_duration_seconds", (("source", event["source"]),), event["seconds"])
+
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def export(self) -> str:
+        """
+        Export all metrics in the OpenMetrics text format.
+        :return: The exposition text, ending with "# EOF".
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series.items():
+                    lines.append(f"{metric}_total{self._labels(labels)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                lines.append(f"# UNIT {metric} seconds")
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), histogram["buckets"]):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f"{metric}_bucket{self._labels(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{metric}_count{self._labels(labels)} {histogram['count']}")
+                    lines.append(f"{metric}_sum{self._labels(labels)} {histogram['sum']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
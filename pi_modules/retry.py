@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised when a request is refused because the circuit breaker of its host is open."""
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 60.0,
+                 statuses: tuple = (409, 429, 502, 503, 504), write_statuses: tuple = (429, 503)):
+        """ Initialize the retry policy.
+        :param max_retries: The maximum number of retries of a request (0 disables retries).
+        :param backoff: The base delay in seconds of the exponential backoff.
+        :param max_backoff: The maximum delay in seconds between two attempts.
+        :param statuses: The status codes that are retried for reads.
+        :param write_statuses: The status codes that are retried for writes, where the server did not apply the request.
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = set(statuses)
+        self.write_statuses = set(write_statuses)
+
+    def should_retry(self, method: str, attempt: int, response=None, error: Exception = None, idempotent: bool = None) -> bool:
+        """
+        Decide whether a request is attempted again.
+        :param method: The HTTP method of the request.
+        :param attempt: The number of retries already made.
+        :param response: The response of the last attempt, if any.
+        :param error: The exception raised by the last attempt, if any.
+        :param idempotent: Whether the request only reads and follows the rules of reads (GET requests only if None).
+        :return: True if the request should be retried.
+        """
+        if attempt >= self.max_retries:
+            return False
+        read = method.upper() == "GET" if idempotent is None else idempotent
+        if error is not None:
+            # A write that failed after it was sent may have been applied already
+            return read or isinstance(error, requests.exceptions.ConnectTimeout)
+        return response.status_code in (self.statuses if read else self.write_statuses)
+
+    def delay(self, attempt: int, response=None) -> float:
+        """
+        Get the number of seconds to wait before the next attempt.
+        Honors a Retry-After header, otherwise uses exponential backoff with full jitter.
+        :param attempt: The number of retries already made.
+        :param response: The response of the last attempt, if any.
+        :return: The delay in seconds.
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    return min(self.max_backoff, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """ Initialize the circuit breaker of one host.
+        :param failure_threshold: The number of consecutive failures that opens the circuit.
+        :param reset_timeout: The number of seconds the circuit stays open before a trial request is let through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        The state of the circuit: "closed", "open" or "half-open".
+        """
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def remaining(self) -> float:
+        """
+        Get the number of seconds until the circuit lets a trial request through (0 unless it is open).
+        """
+        opened_at = self.opened_at
+        if opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - opened_at))
+
+    def allow(self) -> bool:
+        """
+        Check whether a request may be sent.
+        :return: False while the circuit is open, or while a half-open trial request is in flight.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Close the circuit after a successful request.
+        """
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        """
+        Count a failed request and open the circuit once the threshold is reached or a trial request failed.
+        """
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveLimiter:
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_tolerance: float = 2.0):
+        """ Initialize the adaptive concurrency limiter.
+        The limit is halved when the server pushes back and grows by one request per round of
+        successful requests while latency stays close to the best latency seen.
+        :param max_limit: The maximum number of concurrent requests.
+        :param min_limit: The minimum number of concurrent requests.
+        :param latency_tolerance: How many times the baseline latency still counts as recovered.
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.baseline = None
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Wait until a request may be sent under the current limit.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float = None, overloaded: bool = False) -> None:
+        """
+        Release a slot and adapt the limit.
+        :param latency: The latency of the finished request in seconds (None if it failed).
+        :param overloaded: Whether the server signalled overload (e.g. 429/503 or a dropped connection).
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            elif latency is not None:
+                # Track the best latency, slowly forgetting it so the baseline can follow the server
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+                if latency <= self.baseline * self.latency_tolerance:
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
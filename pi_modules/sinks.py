@@ -0,0 +1,122 @@
+import os
+import re
+import pandas as pd
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("pyarrow is required to write Parquet or Arrow files: pip install pyarrow") from e
+    return pyarrow
+
+
+def _conform(df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    # Every batch is written in the columns of the first one, missing columns are left empty
+    if columns is None or list(df.columns) == list(columns):
+        return df
+    return df.reindex(columns=columns)
+
+
+def _table(pa, df: pd.DataFrame, schema=None):
+    df = _conform(df, schema.names if schema is not None else None)
+    # Categories differ between batches, which Arrow files cannot hold as dictionaries, so write plain strings
+    categorical = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if categorical:
+        df = df.assign(**{column: df[column].astype("string") for column in categorical})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is not None and not table.schema.equals(schema):
+        # Batches without a value of a given type (e.g. all NaN) must still match the file schema
+        table = table.select(schema.names).cast(schema)
+    return table
+
+
+def write_parquet(batches, path: str, compression: str = "snappy") -> int:
+    """
+    Stream DataFrame batches into a single Parquet file, one row group per batch.
+    :param batches: An iterable of DataFrames, e.g. from PIDataServerClient.iter_compressed.
+    :param path: The path of the Parquet file.
+    :param compression: The Parquet compression codec.
+    :return: The number of rows written.
+    """
+    pa = _require_pyarrow()
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for df in batches:
+            if df is None or df.empty:
+                continue
+            table = _table(pa, df, schema)
+            if writer is None:
+                schema = table.schema
+                writer = pa.parquet.ParquetWriter(path, schema, compression=compression)
+            writer.write_table(table)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_arrow(batches, path: str) -> int:
+    """
+    Stream DataFrame batches into a single Arrow IPC file, one record batch per DataFrame.
+    :param batches: An iterable of DataFrames, e.g. from PIDataServerClient.iter_compressed.
+    :param path: The path of the Arrow file.
+    :return: The number of rows written.
+    """
+    pa = _require_pyarrow()
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for df in batches:
+            if df is None or df.empty:
+                continue
+            table = _table(pa, df, schema)
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(path, schema)
+            writer.write_table(table)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_csv(batches, path: str, partition_by: str = None) -> int:
+    """
+    Stream DataFrame batches into CSV files, appending every batch as it arrives.
+    :param batches: An iterable of DataFrames, e.g. from PIDataServerClient.iter_compressed.
+    :param path: The CSV file, or the directory of the partition files if partition_by is set.
+    :param partition_by: Write one file per value of this column, or per UTC day if "date" (a single file if None).
+    :return: The number of rows written.
+    """
+    if partition_by:
+        os.makedirs(path, exist_ok=True)
+    written = set()
+    columns = None
+    rows = 0
+    for df in batches:
+        if df is None or df.empty:
+            continue
+        df = _conform(df, columns)
+        columns = list(df.columns)
+        if not partition_by:
+            parts = [(path, df)]
+        else:
+            key = df["Timestamp"].dt.strftime("%Y-%m-%d") if partition_by == "date" else df[partition_by]
+            parts = [
+                (os.path.join(path, re.sub(r'[\\/:*?"<>|]', "_", str(value)) + ".csv"), part)
+                for value, part in df.groupby(key, sort=False, observed=True)
+            ]
+        for file, part in parts:
+            # Start files fresh on the first write of a run and append afterwards
+            part.to_csv(file, mode="a" if file in written else "w", header=file not in written, index=False)
+            written.add(file)
+            rows += len(part)
+    return rows
@@ -0,0 +1,238 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from .times import to_timedelta
+from .decode import string_categorical
+
+
+# DataFrame column -> SQLite column of the values table
+_COLUMNS = {
+    "Value": "value",
+    "DigitalState": "state",
+    "Good": "good",
+    "Questionable": "questionable",
+    "Substituted": "substituted",
+    "Annotated": "annotated",
+    "UnitsAbbreviation": "units",
+}
+
+# Value fields of the frames read back, in the order the PI Web API returns them and decode_streams keeps them
+_FIELDS = ("Value", "DigitalState", "UnitsAbbreviation", "Good", "Questionable", "Substituted", "Annotated")
+
+
+def _ns(timestamp: pd.Timestamp) -> int:
+    return int(pd.Timestamp(timestamp).as_unit("ns").value)
+
+
+def _floor(timestamp: pd.Timestamp, step: pd.Timedelta, phase: pd.Timedelta = None) -> pd.Timestamp:
+    # Grids are anchored at the epoch plus their phase so that repeated runs with moving start times line up
+    offset = phase.value if phase is not None else 0
+    return pd.Timestamp((_ns(timestamp) - offset) // step.value * step.value + offset, tz="UTC")
+
+
+def _ceil(timestamp: pd.Timestamp, step: pd.Timedelta, phase: pd.Timedelta = None) -> pd.Timestamp:
+    offset = phase.value if phase is not None else 0
+    return pd.Timestamp(-(-(_ns(timestamp) - offset) // step.value) * step.value + offset, tz="UTC")
+
+
+class TimeSeriesStore:
+    def __init__(self, path: str, hot_tail: str = "1h"):
+        """ Initialize the local time-series store.
+        :param path: Path of the SQLite file holding the stored values.
+        :param hot_tail: Duration before the current time that is never marked as covered, so it is fetched on every run.
+        """
+        self.path = path
+        self.hot_tail = to_timedelta(hot_tail)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS coverage (key TEXT NOT NULL, webid TEXT NOT NULL, start_ns INTEGER NOT NULL, end_ns INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS coverage_idx ON coverage (key, webid);"
+            "CREATE TABLE IF NOT EXISTS vals (key TEXT NOT NULL, webid TEXT NOT NULL, ts INTEGER NOT NULL, "
+            + ", ".join(f"{column}" for column in _COLUMNS.values()) + ");"
+            "CREATE INDEX IF NOT EXISTS vals_idx ON vals (key, webid, ts);"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(kind: str, params: dict, phase: pd.Timedelta = None) -> str:
+        """
+        Build the key identifying a retrieval type and its parameters, independent of the time range.
+        :param kind: The retrieval type (e.g. "recorded", "summary", "interpolated").
+        :param params: The query parameters of the retrieval.
+        :param phase: The offset of the interval grid from the epoch; intervals of different grids are stored apart.
+        :return: The key.
+        """
+        # maxCount only controls paging and does not change the values that are returned
+        fields = sorted((k, str(v)) for k, v in params.items() if k not in ("startTime", "endTime", "maxCount"))
+        if phase is not None and phase.value:
+            fields.append(("phase", str(phase.value)))
+        return "|".join([kind] + [f"{k}={v}" for k, v in fields])
+
+    def _coverage(self, key: str, webid: str) -> list:
+        rows = self._db.execute(
+            "SELECT start_ns, end_ns FROM coverage WHERE key = ? AND webid = ? ORDER BY start_ns", (key, webid)
+        ).fetchall()
+        return [list(row) for row in rows]
+
+    def gaps(self, key: str, webid: str, start: pd.Timestamp, end: pd.Timestamp, step: pd.Timedelta = None,
+             phase: pd.Timedelta = None) -> list:
+        """
+        Get the parts of a time range that are not covered yet.
+        :param key: The retrieval key (see TimeSeriesStore.key).
+        :param webid: The webid of the point.
+        :param start: The start of the range.
+        :param end: The end of the range.
+        :param step: The interval of the retrieval; gaps are widened to whole intervals.
+        :param phase: The offset of the interval grid from the epoch.
+        :return: A list of (start, end) tuples.
+        """
+        with self._lock:
+            coverage = self._coverage(key, webid)
+        gaps = []
+        position = _ns(start)
+        for covered_start, covered_end in coverage:
+            if covered_end <= position:
+                continue
+            if covered_start > position:
+                gaps.append((position, min(covered_start, _ns(end))))
+            position = max(position, covered_end)
+            if position >= _ns(end):
+                break
+        if position < _ns(end):
+            gaps.append((position, _ns(end)))
+
+        result = []
+        for gap_start, gap_end in gaps:
+            gap_start = pd.Timestamp(gap_start, tz="UTC")
+            gap_end = pd.Timestamp(gap_end, tz="UTC")
+            if step is not None:
+                gap_start = max(_floor(gap_start, step, phase), start)
+                gap_end = min(_ceil(gap_end, step, phase), end)
+            if result and gap_start <= result[-1][1]:
+                result[-1] = (result[-1][0], max(result[-1][1], gap_end))
+            elif gap_end > gap_start:
+                result.append((gap_start, gap_end))
+        return result
+
+    def write(self, key: str, webid: str, df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp, step: pd.Timedelta = None,
+              phase: pd.Timedelta = None) -> None:
+        """
+        Replace the stored values of a time range and mark the settled part of it as covered.
+        :param key: The retrieval key (see TimeSeriesStore.key).
+        :param webid: The webid of the point.
+        :param df: The values of the point in the range (Timestamp column plus value fields).
+        :param start: The start of the fetched range.
+        :param end: The end of the fetched range.
+        :param step: The interval of the retrieval; only whole intervals are marked as covered.
+        :param phase: The offset of the interval grid from the epoch.
+        """
+        settled = min(end, pd.Timestamp.now(tz="UTC") - self.hot_tail)
+        if step is not None:
+            settled = _floor(settled, step, phase)
+
+        rows = []
+        if df is not None and not df.empty:
+            timestamps = df["Timestamp"].dt.as_unit("ns").astype("int64").to_numpy()
+            columns = []
+            for column in _COLUMNS:
+                if column in df:
+                    values = df[column].astype(object).to_numpy()
+                    columns.append([None if pd.isna(value) else value for value in values])
+                else:
+                    columns.append([None] * len(df))
+            rows = [(key, webid, int(ts), *values) for ts, *values in zip(timestamps, *columns)]
+
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM vals WHERE key = ? AND webid = ? AND ts BETWEEN ? AND ?", (key, webid, _ns(start), _ns(end))
+            )
+            self._db.executemany(f"INSERT INTO vals VALUES ({', '.join('?' * (3 + len(_COLUMNS)))})", rows)
+            if settled > start:
+                # Merge the new interval with any overlapping or adjacent ones
+                coverage = self._coverage(key, webid) + [[_ns(start), _ns(settled)]]
+                coverage.sort()
+                merged = [coverage[0]]
+                for covered_start, covered_end in coverage[1:]:
+                    if covered_start <= merged[-1][1]:
+                        merged[-1][1] = max(merged[-1][1], covered_end)
+                    else:
+                        merged.append([covered_start, covered_end])
+                self._db.execute("DELETE FROM coverage WHERE key = ? AND webid = ?", (key, webid))
+                self._db.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?, ?)", [(key, webid, s, e) for s, e in merged]
+                )
+            self._db.commit()
+
+    def read(self, key: str, webids: list, start: pd.Timestamp, end: pd.Timestamp, value_dtype: str = "float64") -> pd.DataFrame:
+        """
+        Read stored values for several points.
+        :param key: The retrieval key (see TimeSeriesStore.key).
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param start: The start of the range.
+        :param end: The end of the range.
+        :param value_dtype: The dtype of the Value column.
+        :return: A DataFrame in the same shape as the client's retrieval methods.
+        """
+        tags = []
+        counts = []
+        rows = []
+        with self._lock:
+            for item in webids:
+                point_rows = self._db.execute(
+                    f"SELECT ts, {', '.join(_COLUMNS[name] for name in _FIELDS)} FROM vals "
+                    "WHERE key = ? AND webid = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                    (key, item['webid'], _ns(start), _ns(end)),
+                ).fetchall()
+                if point_rows:
+                    tags.append(item['tag'])
+                    counts.append(len(point_rows))
+                    rows.extend(point_rows)
+        if not rows:
+            return pd.DataFrame()
+
+        columns = list(zip(*rows))
+        data = {
+            "Tag": pd.Categorical.from_codes(np.repeat(np.arange(len(tags)), counts), categories=tags),
+            "Timestamp": pd.to_datetime(np.array(columns[0], dtype=np.int64), unit="ns", utc=True),
+        }
+        for name, values in zip(_FIELDS, columns[1:]):
+            if name == "Value":
+                data[name] = np.array([np.nan if value is None else value for value in values], dtype=value_dtype)
+            elif name == "DigitalState":
+                # Always present, as in decode_streams
+                data[name] = string_categorical(values)
+            elif any(value is not None for value in values):
+                if name == "UnitsAbbreviation":
+                    data[name] = string_categorical(values)
+                else:
+                    data[name] = np.array(values, dtype=bool)
+        return pd.DataFrame(data)
+
+    def invalidate(self, key: str = None, webid: str = None) -> None:
+        """
+        Remove stored values and coverage.
+        :param key: Only remove this retrieval key (all keys if None).
+        :param webid: Only remove this point (all points if None).
+        """
+        where = []
+        args = []
+        if key is not None:
+            where.append("key = ?")
+            args.append(key)
+        if webid is not None:
+            where.append("webid = ?")
+            args.append(webid)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            self._db.execute(f"DELETE FROM vals{clause}", args)
+            self._db.execute(f"DELETE FROM coverage{clause}", args)
+            self._db.commit()
+
+    def close(self) -> None:
+        """
+        Close the underlying SQLite connection.
+        """
+        with self._lock:
+            self._db.close()
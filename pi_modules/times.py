@@ -0,0 +1,93 @@
+import re
+from datetime import datetime
+import pandas as pd
+
+
+_UNITS = {
+    "s": "seconds", "sec": "seconds", "second": "seconds", "seconds": "seconds",
+    "m": "minutes", "min": "minutes", "minute": "minutes", "minutes": "minutes",
+    "h": "hours", "hr": "hours", "hour": "hours", "hours": "hours",
+    "d": "days", "day": "days", "days": "days",
+    "w": "weeks", "week": "weeks", "weeks": "weeks",
+    "mo": "months", "month": "months", "months": "months",
+    "y": "years", "year": "years", "years": "years",
+}
+
+_OFFSET = re.compile(r"([+-])\s*(\d+(?:\.\d+)?)\s*([a-z]+)")
+
+
+def to_timestamp(value, now: pd.Timestamp = None, tz: str = None) -> pd.Timestamp:
+    """
+    Convert a PI time expression or timestamp to a UTC timestamp.
+    Supports absolute times and the relative forms "*", "T" (today), "Y" (yesterday)
+    with optional offsets, e.g. "*-1d", "T-1d", "T+6h", "-2h".
+    :param value: The time expression, datetime or timestamp.
+    :param now: The reference time for relative expressions (defaults to the current time).
+    :param tz: The time zone of midnight for "T" and "Y" and of time strings without an offset
+        (the time zone of this machine if None). Timestamps and datetimes without a time zone are UTC.
+    :return: A timezone-aware UTC pd.Timestamp.
+    """
+    if not isinstance(value, str):
+        timestamp = pd.Timestamp(value)
+        return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+    zone = tz if tz is not None else datetime.now().astimezone().tzinfo
+    if now is None:
+        now = pd.Timestamp.now(tz="UTC")
+    local_now = now.tz_convert(zone)
+    expression = value.strip().lower()
+
+    base = None
+    for name, anchor in (("*", local_now),
+                         ("today", local_now.normalize()), ("t", local_now.normalize()),
+                         ("yesterday", local_now.normalize() - pd.Timedelta(days=1)), ("y", local_now.normalize() - pd.Timedelta(days=1))):
+        if expression.startswith(name) and not expression[len(name):len(name) + 1].isalpha():
+            base = anchor
+            expression = expression[len(name):].strip()
+            break
+    if base is None:
+        if not expression or expression[0] not in "+-":
+            timestamp = pd.Timestamp(value)
+            return timestamp.tz_localize(zone).tz_convert("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+        base = local_now
+
+    position = 0
+    for match in _OFFSET.finditer(expression):
+        if expression[position:match.start()].strip():
+            raise ValueError(f"Unsupported time expression: '{value}'")
+        sign, amount, unit = match.groups()
+        if unit not in _UNITS:
+            raise ValueError(f"Unsupported time unit '{unit}' in '{value}'")
+        amount = float(amount) if sign == "+" else -float(amount)
+        unit = _UNITS[unit]
+        if unit in ("months", "years"):
+            base = base + pd.DateOffset(**{unit: int(amount)})
+        else:
+            base = base + pd.Timedelta(**{unit: amount})
+        position = match.end()
+    if expression[position:].strip():
+        raise ValueError(f"Unsupported time expression: '{value}'")
+    return base.tz_convert("UTC")
+
+
+def to_pi_time(timestamp: pd.Timestamp) -> str:
+    """
+    Format a timestamp as an absolute time accepted by the PI Web API.
+    :param timestamp: The timestamp.
+    :return: An ISO 8601 UTC time string.
+    """
+    return to_timestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def to_timedelta(value) -> pd.Timedelta:
+    """
+    Convert a PI duration such as "1h", "5m" or "30s" to a timedelta.
+    :param value: The duration expression or timedelta.
+    :return: A pd.Timedelta.
+    """
+    if not isinstance(value, str):
+        return pd.Timedelta(value)
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-z]+)\s*", value.lower())
+    if not match or _UNITS.get(match.group(2)) in (None, "months", "years"):
+        raise ValueError(f"Unsupported duration: '{value}'")
+    return pd.Timedelta(**{_UNITS[match.group(2)]: float(match.group(1))})
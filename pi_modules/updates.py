@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlencode
+import pandas as pd
+from .clients import _chunk_query_values
+from .decode import decode_streams
+
+
+class StreamSubscription:
+    def __init__(self, client, webids: list, marker_path: str = None):
+        """ Initialize a subscription to the updates of a set of PI Points.
+        Use PIDataServerClient.subscribe rather than creating it directly.
+        :param client: The PIDataServerClient the subscription polls through.
+        :param webids: A list of dictionaries containing tag names and their corresponding webids.
+        :param marker_path: Path of a JSON file the markers are saved to after every poll, so a restart resumes from them.
+        """
+        self.client = client
+        self.marker_path = marker_path
+        self.logger = logging.getLogger("StreamSubscription")
+        self.tags = {item['webid']: item['tag'] for item in webids}
+        self.markers = {}
+        self._lock = threading.Lock()
+        if marker_path and os.path.exists(marker_path):
+            with open(marker_path) as f:
+                saved = json.load(f)
+            self.markers = {webid: marker for webid, marker in saved.items() if webid in self.tags}
+            self.logger.info(f"Resuming {len(self.markers)} of {len(self.tags)} streams from '{marker_path}'.")
+        self._register([webid for webid in self.tags if webid not in self.markers])
+
+    def _register(self, webids: list) -> None:
+        """
+        Register streams for updates and keep their initial markers.
+        :param webids: The webids to register.
+        """
+        if not webids:
+            return
+        url = f"{self.client.base_url}/streamsets/updates"
+        extra = self.client._lean([], "Items.Source;Items.LatestMarker;Items.Exception")
+        budget = self.client.max_url_length - len(url) - len(urlencode(extra)) - 2
+
+        def register(chunk):
+            # Markers only exist on the node that issued them, so all requests of a subscription stay on one node
+            response = self.client._request("POST", url, affinity=id(self), params=[("webId", webid) for webid in chunk] + extra)
+            if response.status_code not in (200, 202, 207):
+                self.logger.error(f"Failed to register {len(chunk)} streams for updates: {response.status_code} - {response.text}")
+                return []
+            return self.client._parse(response).get("Items", [])
+
+        chunks = list(_chunk_query_values(webids, "webId", budget))
+        for items in self.client._map(register, chunks):
+            for item in items:
+                if item.get("LatestMarker"):
+                    self.markers[item.get("Source")] = item["LatestMarker"]
+                else:
+                    self.logger.error(f"Failed to register tag '{self.tags.get(item.get('Source'))}' for updates: {item.get('Exception')}")
+        self._save()
+
+    def _save(self) -> None:
+        if not self.marker_path:
+            return
+        temp = f"{self.marker_path}.tmp"
+        with open(temp, "w") as f:
+            json.dump(self.markers, f)
+        # Replace atomically so an interrupted write never loses the previous markers
+        os.replace(temp, self.marker_path)
+
+    def poll(self) -> pd.DataFrame:
+        """
+        Retrieve the events recorded since the previous poll.
+        :return: A DataFrame of the new events in the same shape as compressed_data, with an Action column.
+        """
+        with self._lock:
+            url = f"{self.client.base_url}/streamsets/updates"
+            extra = self.client._lean([], "Items.Source;Items.SourceName;Items.LatestMarker;Items.Exception;"
+                                          "Items.Events.Timestamp;Items.Events.Value;Items.Events.Action")
+            budget = self.client.max_url_length - len(url) - len(urlencode(extra)) - 2
+            markers = list(self.markers.values())
+
+            def fetch(chunk):
+                response = self.client._request("GET", url, affinity=id(self), params=[("marker", marker) for marker in chunk] + extra)
+                if response.status_code not in (200, 207):
+                    self.logger.error(f"Failed to get updates for {len(chunk)} streams: {response.status_code} - {response.text}")
+                    return []
+                return self.client._parse(response).get("Items", [])
+
+            results = []
+            expired = []
+            chunks = list(_chunk_query_values(markers, "marker", budget))
+            for items in self.client._map(fetch, chunks):
+                for item in items:
+                    webid = item.get("Source")
+                    if item.get("LatestMarker"):
+                        self.markers[webid] = item["LatestMarker"]
+                        results.append((self.tags.get(webid) or item.get("SourceName") or webid, item.get("Events") or []))
+                    elif webid in self.tags:
+                        # Markers expire on the server when they are not polled for a while
+                        expired.append(webid)
+            if expired:
+                self.logger.error(f"Updates of {len(expired)} streams were lost, registering them again.")
+                for webid in expired:
+                    self.markers.pop(webid, None)
+                self._register(expired)
+            else:
+                self._save()
+            return decode_streams(results, self.client.value_dtype)
+
+    def listen(self, interval: float = 5.0):
+        """
+        Poll for updates forever.
+        :param interval: The number of seconds between the start of two polls.
+        :return: A generator of DataFrames, one per poll that returned new events.
+        """
+        while True:
+            started = time.monotonic()
+            data = self.poll()
+            if not data.empty:
+                yield data
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def run(self, callback, interval: float = 5.0, stop: threading.Event = None) -> None:
+        """
+        Poll for updates and pass every batch of new events to a callback.
+        :param callback: A function called with the DataFrame of new events.
+        :param interval: The number of seconds between the start of two polls.
+        :param stop: An event that ends the loop when it is set.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            started = time.monotonic()
+            data = self.poll()
+            if not data.empty:
+                callback(data)
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,46 @@
+import unittest
+from benchmarks.mock_server import MockPIWebAPI
+from pi_modules import PIDataServerClient
+from pi_modules.retry import RetryPolicy
+
+START = "2024-01-01T00:00:00Z"
+END = "2024-01-01T02:00:00Z"
+
+
+class BatchQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockPIWebAPI(points=60).start()
+        self.tags = [MockPIWebAPI.tag(i) for i in range(50)]
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def _client(self, **kwargs):
+        return PIDataServerClient(self.mock.base_url, auth=None, use_batch=True, circuit_breaker_threshold=10 ** 6,
+                                  retry_policy=RetryPolicy(max_retries=20, backoff=0.0), **kwargs)
+
+    def test_transient_failures_are_read_again(self):
+        expected = self._client().compressed_data("PIMOCK", self.tags, START, END)
+        # Small URLs split the lookups into several chunks, some of which fail inside the batch
+        client = self._client(max_url_length=600)
+        self.mock.error_rate = 0.3
+        for _ in range(2):
+            # The first run looks the tags up inside the batch, the second reads cached webids
+            data = client.compressed_data("PIMOCK", self.tags, START, END)
+            self.assertEqual(data.groupby("Tag", observed=True).size().to_dict(),
+                             expected.groupby("Tag", observed=True).size().to_dict())
+
+    def test_batches_are_split_and_read_streamsets(self):
+        expected = self._client().compressed_data("PIMOCK", self.tags, START, END)
+        client = self._client(streamset_size=10)
+        for _ in range(2):
+            # The first run looks the tags up, the second reads the cached webids through streamsets
+            self.mock.reset_stats()
+            data = client.compressed_data("PIMOCK", self.tags, START, END, streamsets=True)
+            self.assertEqual(self.mock.stats["requests"], 5)
+            self.assertEqual(data.groupby("Tag", observed=True).size().to_dict(),
+                             expected.groupby("Tag", observed=True).size().to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from benchmarks.mock_server import MockPIWebAPI
+from pi_modules import PIDataServerClient
+from pi_modules.retry import RetryPolicy
+
+START = "2024-01-01T00:00:00Z"
+END = "2024-01-01T06:00:00Z"
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockPIWebAPI(points=300).start()
+        self.tags = [MockPIWebAPI.tag(i) for i in range(300)]
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def _client(self, **kwargs):
+        # The default threshold, with a short open period to keep the test fast
+        return PIDataServerClient(self.mock.base_url, auth=None, max_workers=8, circuit_breaker_timeout=0.2, **kwargs)
+
+    def test_open_circuit_is_waited_for(self):
+        client = self._client()
+        client.webids("PIMOCK", self.tags)
+        node = client.pool.nodes[0]
+        for _ in range(node.breaker.failure_threshold):
+            node.breaker.record_failure()
+        self.assertEqual(node.breaker.state, "open")
+        data = client.summary_data("PIMOCK", self.tags[:20], START, END, "1h")
+        self.assertEqual(data.Tag.nunique(), 20)
+        self.assertEqual(node.breaker.state, "closed")
+
+    def test_transient_failures_do_not_abort_the_call(self):
+        client = self._client(retry_policy=RetryPolicy(max_retries=20, backoff=0.0))
+        client.webids("PIMOCK", self.tags)
+        self.mock.error_rate = 0.3
+        data = client.summary_data("PIMOCK", self.tags, START, END, "1h")
+        self.assertEqual(data.Tag.nunique(), len(self.tags))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from benchmarks.mock_server import MockPIWebAPI
+from pi_modules import PIDataServerClient
+from pi_modules.retry import RetryPolicy
+
+START = "2024-01-01T00:00:00Z"
+END = "2024-01-01T06:00:00Z"
+
+
+class StoreCoverageTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockPIWebAPI(points=20).start()
+        self.tags = [MockPIWebAPI.tag(i) for i in range(10)]
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.mock.stop()
+        self.directory.cleanup()
+
+    def _client(self, **kwargs):
+        return PIDataServerClient(self.mock.base_url, auth=None, retry_policy=RetryPolicy(max_retries=0),
+                                  circuit_breaker_threshold=10 ** 6, **kwargs)
+
+    def _check_failed_ranges_are_refetched(self, **options):
+        expected = self._client().compressed_data("PIMOCK", self.tags, START, END, maxCount=50, **options)
+        client = self._client(store_path=os.path.join(self.directory.name, "store.db"))
+        client.webids("PIMOCK", self.tags)
+        self.mock.error_rate = 0.3
+        partial = client.compressed_data("PIMOCK", self.tags, START, END, maxCount=50, **options)
+        self.assertLess(0 if partial is None else len(partial), len(expected))
+
+        self.mock.error_rate = 0.0
+        complete = client.compressed_data("PIMOCK", self.tags, START, END, maxCount=50, **options)
+        self.assertGreater(client.last_metrics.requests, 0)
+        self.assertEqual(len(complete), len(expected))
+        self.assertEqual(list(complete.columns), list(expected.columns))
+        self.assertEqual(complete.dtypes.to_dict(), expected.dtypes.to_dict())
+        self.assertEqual(complete.groupby("Tag", observed=True).size().to_dict(),
+                         expected.groupby("Tag", observed=True).size().to_dict())
+
+        client.compressed_data("PIMOCK", self.tags, START, END, maxCount=50, **options)
+        self.assertEqual(client.last_metrics.requests, 0)
+
+    def test_failed_pages_stay_uncovered(self):
+        self._check_failed_ranges_are_refetched()
+
+    def test_failed_windows_stay_uncovered(self):
+        self._check_failed_ranges_are_refetched(points_per_window=60)
+
+
+class StoreAlignmentTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockPIWebAPI(points=5).start()
+        self.tags = [MockPIWebAPI.tag(i) for i in range(3)]
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.mock.stop()
+        self.directory.cleanup()
+
+    def _compare(self, method, starttime, endtime, *args):
+        direct = getattr(PIDataServerClient(self.mock.base_url, auth=None), method)("PIMOCK", self.tags, starttime, endtime, *args)
+        client = PIDataServerClient(self.mock.base_url, auth=None, store_path=os.path.join(self.directory.name, "store.db"))
+        # A longer run first, so the store holds values around the requested range
+        getattr(client, method)("PIMOCK", self.tags, "2024-01-01T00:00:00Z", "2024-01-01T06:00:00Z", *args)
+        getattr(client, method)("PIMOCK", self.tags, starttime, endtime, *args)
+        # The second call of the same grid is served from the store
+        stored = getattr(client, method)("PIMOCK", self.tags, starttime, endtime, *args)
+        self.assertEqual(client.last_metrics.requests, 0)
+        self.assertEqual(stored.dtypes.to_dict(), direct.dtypes.to_dict())
+        self.assertEqual(list(stored.columns), list(direct.columns))
+        self.assertEqual(stored["Timestamp"].tolist(), direct["Timestamp"].tolist())
+        self.assertEqual(stored["Value"].round(6).tolist(), direct["Value"].round(6).tolist())
+
+    def test_unaligned_summary_matches_direct_read(self):
+        self._compare("summary_data", "2024-01-01T00:30:00Z", "2024-01-01T03:30:00Z", "1h")
+
+    def test_aligned_summary_stays_in_range(self):
+        self._compare("summary_data", "2024-01-01T01:00:00Z", "2024-01-01T03:00:00Z", "1h")
+
+    def test_unaligned_interpolated_matches_direct_read(self):
+        self._compare("interpolated_data", "2024-01-01T00:10:00Z", "2024-01-01T03:10:00Z", "1h")
+
+
+if __name__ == "__main__":
+    unittest.main()